@@ -0,0 +1,255 @@
+"""Пропускная способность при многих одновременных соединениях: WSGI
+против ASGI (yatube.asgi) на локальном сервере.
+
+    python benchmarks/asgi_serving.py [--threads 8] [--connections 32]
+        [--slow-clients 16] [--seconds 10]
+
+Оба режима обслуживают запросы одинаковым числом потоков (--threads),
+как синхронный сервер с таким числом воркеров:
+
+* ``wsgi`` — WSGI-сервер Django с пулом из --threads потоков, каждый
+  держит соединение от первого байта запроса до последнего байта ответа;
+* ``asgi`` — uvicorn с ``posts.asgi.AsgiHandler``; соединения держит
+  цикл событий, потоки заняты только самими views
+  (``ASGI_READ_THREADS`` = ``ASGI_THREADS`` = --threads).
+
+--connections клиентов без пауз читают ленты, профили и посты, а
+--slow-clients медленных клиентов шлют заголовки запроса по строке за
+--slow-seconds, как мобильные клиенты на плохой сети. Каждый режим
+работает в отдельном процессе с новой базой. Для режима asgi нужен
+uvicorn (pip install uvicorn).
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from common import setup_django
+
+MODES = ('wsgi', 'asgi')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed(posts):
+    from django.urls import reverse
+
+    from posts.models import Group, Post, User
+
+    authors = [User.objects.create_user(username=f'author{number}')
+               for number in range(20)]
+    group = Group.objects.create(title='Группа', slug='group')
+    Post.objects.bulk_create(
+        Post(text=f'Пост номер {number}', author=authors[number % 20],
+             group=group if number % 2 else None)
+        for number in range(posts))
+    post_urls = [reverse('posts:post', args=[username, pk])
+                 for username, pk in Post.objects.values_list(
+                     'author__username', 'pk')[:200]]
+    return [reverse('posts:index'), reverse('posts:group', args=['group']),
+            *(reverse('posts:profile', args=[author.username])
+              for author in authors),
+            *post_urls]
+
+
+class WSGIServer:
+    def __init__(self, port, threads):
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.core.servers.basehttp import WSGIRequestHandler
+        from django.core.servers.basehttp import WSGIServer as BaseServer
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        class PooledServer(BaseServer):
+            # Очередь соединений как у uvicorn, чтобы их не сбрасывало ядро.
+            request_queue_size = 2048
+
+            def process_request(self, request, client_address):
+                pool.submit(self.process_request_thread, request,
+                            client_address)
+
+            def process_request_thread(self, request, client_address):
+                try:
+                    self.finish_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+
+        pool = ThreadPoolExecutor(threads)
+        self.httpd = PooledServer(('127.0.0.1', port), QuietHandler)
+        self.httpd.set_app(WSGIHandler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ASGIServer:
+    def __init__(self, port, threads):
+        import uvicorn
+
+        from posts.asgi import AsgiHandler
+
+        config = uvicorn.Config(
+            AsgiHandler(), host='127.0.0.1', port=port, lifespan='on',
+            log_level='warning')
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run)
+        self.thread.daemon = True
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def slow_request(port, path, seconds):
+    lines = [f'GET {path} HTTP/1.1', 'Host: 127.0.0.1', 'User-Agent: slow',
+             'Accept: text/html', 'Connection: close']
+    with socket.create_connection(('127.0.0.1', port), timeout=60) as sock:
+        for line in lines:
+            sock.sendall(f'{line}\r\n'.encode())
+            time.sleep(seconds / len(lines))
+        sock.sendall(b'\r\n')
+        while sock.recv(65536):
+            pass
+
+
+def percentile(ordered, value):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1,
+                             int(len(ordered) * value / 100))], 1)
+
+
+class Load:
+    """Быстрые и медленные клиенты до ``deadline``: задержки быстрых
+    в мс, их ошибки и число ответов медленным."""
+
+    def __init__(self, port, urls, args):
+        self.port = port
+        self.urls = urls
+        self.args = args
+        self.deadline = time.monotonic() + args.seconds
+        self.lock = threading.Lock()
+        self.timings = []
+        self.errors = self.slow_served = 0
+
+    def fast_client(self, rng):
+        while time.monotonic() < self.deadline:
+            url = f'http://127.0.0.1:{self.port}{rng.choice(self.urls)}'
+            began = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=60) as response:
+                    response.read()
+            except (OSError, urllib.error.URLError):
+                with self.lock:
+                    self.errors += 1
+                continue
+            with self.lock:
+                self.timings.append((time.perf_counter() - began) * 1000)
+
+    def slow_client(self, rng):
+        while time.monotonic() < self.deadline:
+            try:
+                slow_request(self.port, rng.choice(self.urls),
+                             self.args.slow_seconds)
+            except OSError:
+                continue
+            with self.lock:
+                self.slow_served += 1
+
+    def run(self):
+        clients = [threading.Thread(target=self.fast_client,
+                                    args=(random.Random(number),))
+                   for number in range(self.args.connections)]
+        clients += [threading.Thread(target=self.slow_client,
+                                     args=(random.Random(-number),))
+                    for number in range(1, self.args.slow_clients + 1)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        self.timings.sort()
+
+
+def run_mode(mode, args):
+    database = os.path.join(
+        tempfile.mkdtemp(prefix='yatube-asgi-'), 'db.sqlite3')
+    setup_django(
+        database=database, DEBUG=False, ALLOWED_HOSTS=['127.0.0.1'],
+        PAGE_CACHE_TIMEOUT=args.page_cache, ASGI_THREADS=args.threads,
+        ASGI_READ_THREADS=args.threads)
+    urls = seed(args.posts)
+    port = free_port()
+    server = (WSGIServer if mode == 'wsgi' else ASGIServer)(
+        port, args.threads)
+    load = Load(port, urls, args)
+    try:
+        load.run()
+    finally:
+        server.stop()
+    return {'rps': round(len(load.timings) / args.seconds, 1),
+            'p50_ms': percentile(load.timings, 50),
+            'p99_ms': percentile(load.timings, 99),
+            'errors': load.errors, 'slow_served': load.slow_served}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--slow-clients', type=int, default=16)
+    parser.add_argument('--slow-seconds', type=float, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--page-cache', type=int, default=0,
+                        help='PAGE_CACHE_TIMEOUT; 0 — каждый запрос идёт '
+                             'в базу.')
+    parser.add_argument('--mode', choices=MODES,
+                        help='Запустить один режим и вывести JSON.')
+    args = parser.parse_args()
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args)))
+        return
+
+    print(f'{args.threads} потоков, {args.connections} клиентов, '
+          f'{args.slow_clients} медленных, {args.seconds:g} с')
+    print(f'{"":<8}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}'
+          f'{"errors":>8}{"slow":>8}')
+    options = [argument for argument in sys.argv[1:]
+               if not argument.startswith('--mode')]
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, *options],
+            check=True, stdout=subprocess.PIPE, text=True).stdout
+        row = json.loads(output.strip().splitlines()[-1])
+        print(f'{mode:<8}{row["rps"]:>10}{row["p50_ms"]!s:>10}'
+              f'{row["p99_ms"]!s:>10}{row["errors"]:>8}'
+              f'{row["slow_served"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
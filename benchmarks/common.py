@@ -0,0 +1,86 @@
+"""Общая обвязка бенчмарков: Django с тестовой БД и временным MEDIA_ROOT.
+
+Запуск из корня репозитория: ``python benchmarks/<имя>.py``.
+"""
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_DIR = os.path.join(ROOT_DIR, 'yatube')
+
+
+def setup_django(database=None, sqlite_production=False, **overrides):
+    """Настроить Django и создать чистую тестовую БД.
+
+    ``database`` — путь к файлу тестовой БД, если она должна быть видна
+    из других потоков (по умолчанию SQLite в памяти);
+    ``sqlite_production`` — взять профиль БД ``SQLITE_PRODUCTION``.
+    ``overrides`` — значения настроек поверх ``yatube.settings``.
+    """
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    from django.conf import settings
+
+    if sqlite_production:
+        settings.DATABASES['default'] = dict(settings.SQLITE_PRODUCTION)
+    if database:
+        settings.DATABASES['default']['TEST'] = {'NAME': database}
+    django.setup()
+    settings.MEDIA_ROOT = tempfile.mkdtemp(prefix='yatube-bench-')
+    settings.IMAGE_STAGING_ROOT = os.path.join(settings.MEDIA_ROOT, 'uploads')
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def make_image(name='photo.jpg', size=(1920, 1080), fmt='JPEG'):
+    """Загружаемая картинка с шумом, чтобы кодек не сжал её в ноль."""
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+
+    image = Image.effect_noise(size, 64).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+def measure(func, repeat, before=None):
+    """Время вызовов ``func`` в миллисекундах; ``before`` вызывается
+    перед каждым замером и в него не входит."""
+    timings = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def summary(timings):
+    ordered = sorted(timings)
+    return {
+        'runs': len(ordered),
+        'median_ms': round(statistics.median(ordered), 2),
+        'p95_ms': round(ordered[int(0.95 * (len(ordered) - 1))], 2),
+        'min_ms': round(ordered[0], 2),
+    }
+
+
+def print_table(rows):
+    """Напечатать ``{название: summary(...)}`` столбцами."""
+    print(f'{"":<28}{"runs":>6}{"median ms":>12}{"p95 ms":>10}{"min ms":>10}')
+    for name, row in rows.items():
+        print(f'{name:<28}{row["runs"]:>6}{row["median_ms"]:>12}'
+              f'{row["p95_ms"]:>10}{row["min_ms"]:>10}')
@@ -0,0 +1,99 @@
+"""Сколько байт картинок скачивает браузер за страницу ленты из 10
+постов: раньше (JPEG 960x339 всем) и теперь (<picture> со srcset).
+
+    python benchmarks/feed_bytes.py
+
+Для каждого клиента из CLIENTS выбирается то, что выбрал бы браузер:
+первый поддерживаемый <source> и в нём наименьшая ширина не меньше
+ширины карточки в физических пикселях.
+"""
+import io
+import os
+import re
+
+from common import setup_django
+
+# Клиент: (ширина карточки в CSS-пикселях, плотность пикселей,
+# поддерживаемые MIME-типы).
+CLIENTS = {
+    'JPEG only, desktop': (960, 1, {'image/jpeg'}),
+    'JPEG only, phone @2x': (360, 2, {'image/jpeg'}),
+    'desktop': (960, 1, {'image/webp', 'image/jpeg'}),
+    'tablet': (720, 1, {'image/webp', 'image/jpeg'}),
+    'phone 360px @2x': (360, 2, {'image/webp', 'image/jpeg'}),
+    'phone 360px @1x': (360, 1, {'image/webp', 'image/jpeg'}),
+}
+
+PICTURE_RE = re.compile(r'<picture>(.*?)</picture>', re.S)
+SOURCE_RE = re.compile(r'<source type="([^"]+)" srcset="([^"]+)"')
+IMG_RE = re.compile(r'<img class="card-img" src="([^"]+)"')
+
+
+def make_photo(name, seed):
+    """Картинка, похожая на фотографию: плавные переходы и немного шума,
+    чтобы кодеки сжимали её как настоящий снимок."""
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+
+    gradient = Image.radial_gradient('L').resize((1920, 1080))
+    noise = Image.effect_noise((1920, 1080), 12 + seed)
+    channels = [
+        Image.blend(gradient, noise, 0.2),
+        Image.linear_gradient('L').resize((1920, 1080)),
+        Image.blend(gradient.rotate(seed * 30), noise, 0.1),
+    ]
+    buffer = io.BytesIO()
+    Image.merge('RGB', channels).save(buffer, 'JPEG', quality=90)
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+def choose(picture, width, density, types):
+    """URL, который скачает браузер для разметки ``picture``."""
+    needed = width * density
+    for mime, srcset in SOURCE_RE.findall(picture):
+        if mime not in types:
+            continue
+        candidates = sorted(
+            (int(size[:-1]), url) for url, size
+            in (item.split() for item in srcset.split(', ')))
+        for size, url in candidates:
+            if size >= needed:
+                return url
+        return candidates[-1][1]
+    return IMG_RE.search(picture).group(1)
+
+
+def main():
+    setup_django(PAGES=10, PAGE_CACHE_TIMEOUT=0)
+
+    from django.conf import settings
+    from django.test import Client
+
+    from posts.models import Post, User
+
+    author = User.objects.create_user(username='author')
+    for number in range(10):
+        Post.objects.create(text=f'Пост номер {number}', author=author,
+                            image=make_photo(f'photo{number}.jpg', number))
+
+    def size(url):
+        path = url[len(settings.MEDIA_URL):]
+        return os.path.getsize(os.path.join(settings.MEDIA_ROOT, path))
+
+    html = Client().get('/').content.decode()
+    pictures = PICTURE_RE.findall(html)
+    assert len(pictures) == 10, 'на странице должно быть 10 карточек'
+    before = sum(size(post.thumbnail_urls['card'])
+                 for post in Post.objects.all())
+
+    print(f'{"":<24}{"KiB/page":>10}{"vs before":>11}')
+    print(f'{"before: JPEG 960":<24}{before / 1024:>10.1f}{"":>11}')
+    for client, (width, density, types) in CLIENTS.items():
+        total = sum(size(choose(picture, width, density, types))
+                    for picture in pictures)
+        print(f'{client:<24}{total / 1024:>10.1f}'
+              f'{(total - before) / before:>+11.0%}')
+
+
+if __name__ == '__main__':
+    main()
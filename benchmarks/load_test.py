@@ -0,0 +1,423 @@
+"""Нагрузочный бенчмарк страниц постов и пользователей.
+
+    python benchmarks/load_test.py [--users 200] [--posts 2000] ...
+    python benchmarks/load_test.py --compare old.json new.json
+
+Создаёт синтетический набор данных заданного размера (пользователи,
+группы, посты, часть с картинками, комментарии, граф подписок) через
+``posts.transfer`` и гоняет по каждому сценарию из ENDPOINTS:
+
+* ``inprocess`` — последовательно через тестовый клиент Django, с
+  числом SQL-запросов и пиком выделенной Python-памяти на запрос;
+* ``server`` — по HTTP к локальному многопоточному WSGI-серверу
+  в --concurrency потоков.
+
+Отчёт — задержки p50/p95/p99, запросы в секунду, SQL на запрос и
+память — печатается и сохраняется в JSON (--output, по умолчанию
+benchmarks/results/<коммит>.json), чтобы сравнивать коммиты через
+--compare. Страницы читает авторизованный пользователь, поэтому кеш
+страниц для анонимов не участвует; --anonymous — читать анонимно.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from common import ROOT_DIR, setup_django
+
+# Сценарий: (метод, нужен ли вход).
+ENDPOINTS = {
+    'index': ('GET', False),
+    'group': ('GET', False),
+    'profile': ('GET', False),
+    'post': ('GET', False),
+    'follow': ('GET', True),
+    'new_post': ('POST', True),
+    'add_comment': ('POST', True),
+}
+PERCENTILES = (50, 95, 99)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+            check=True, stdout=subprocess.PIPE, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def percentile(ordered, value):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * value / 100))]
+
+
+def latency_summary(timings, seconds):
+    ordered = sorted(timings)
+    result = {'requests': len(ordered),
+              'rps': round(len(ordered) / seconds, 1)}
+    for value in PERCENTILES:
+        result[f'p{value}_ms'] = (
+            round(percentile(ordered, value), 2) if ordered else None)
+    result['mean_ms'] = round(statistics.mean(ordered), 2) if ordered else None
+    return result
+
+
+def write_dataset(directory, args):
+    """Файлы выгрузки для ``posts.transfer`` и папка картинок."""
+    from PIL import Image
+
+    rng = random.Random(args.seed)
+    images_dir = os.path.join(directory, 'images')
+    os.makedirs(images_dir)
+    for number in range(args.distinct_images):
+        image = Image.effect_noise((800, 600), 20 + number).convert('RGB')
+        image.save(os.path.join(images_dir, f'{number}.jpg'), quality=85)
+
+    users = [f'user{number}' for number in range(args.users)]
+    groups = [f'group{number}' for number in range(args.groups)]
+    start = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+    def dump(kind, rows):
+        path = os.path.join(directory, f'{kind}.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    dump('groups', ({'slug': slug, 'title': f'Группа {slug}',
+                     'description': 'Группа для нагрузочного теста'}
+                    for slug in groups))
+    dump('posts', ({
+        'id': number,
+        'text': ' '.join(rng.choice(('Текст', 'поста', 'про', 'котов',
+                                     'и', 'лисиц')) for _ in range(40)),
+        'pub_date': (start + timedelta(minutes=number)).isoformat(),
+        'author': rng.choice(users),
+        'group': rng.choice(groups) if rng.random() < 0.7 else None,
+        'image': (f'{rng.randrange(args.distinct_images)}.jpg'
+                  if rng.random() < args.image_share else None),
+    } for number in range(args.posts)))
+    dump('comments', ({
+        'id': number, 'post': rng.randrange(args.posts),
+        'author': rng.choice(users), 'text': 'Комментарий',
+        'created': (start + timedelta(minutes=number)).isoformat(),
+    } for number in range(args.posts * args.comments_per_post)))
+    dump('follows', ({'user': user, 'author': author}
+                     for user in users
+                     for author in rng.sample(
+                         users, min(args.follows_per_user, len(users)))
+                     if author != user))
+    return images_dir
+
+
+def seed(args):
+    from posts import transfer
+    from posts.models import Comment, Follow, Group, Post, User
+
+    directory = tempfile.mkdtemp(prefix='yatube-load-')
+    images_dir = write_dataset(directory, args)
+    started = time.monotonic()
+    transfer.Importer(directory, images_dir=images_dir, batch_size=1000).run()
+    return {
+        'users': User.objects.count(),
+        'groups': Group.objects.count(),
+        'posts': Post.objects.count(),
+        'posts_with_images': Post.objects.exclude(image='').exclude(
+            image=None).count(),
+        'comments': Comment.objects.count(),
+        'follows': Follow.objects.count(),
+        'seed_seconds': round(time.monotonic() - started, 1),
+    }
+
+
+def make_requests(args):
+    """Список ``(метод, путь, данные)`` для каждого сценария."""
+    from django.urls import reverse
+
+    from posts.models import Group, Post, User
+
+    rng = random.Random(args.seed + 1)
+    usernames = list(User.objects.values_list('username', flat=True))
+    slugs = list(Group.objects.values_list('slug', flat=True))
+    posts = list(Post.objects.values_list('author__username', 'pk'))
+    count = args.requests + args.warmup
+
+    def post_url(name):
+        username, pk = rng.choice(posts)
+        return reverse(name, args=[username, pk])
+
+    def paged(url):
+        # Первые страницы популярнее дальних.
+        page = min(int(rng.expovariate(0.5)) + 1, 50)
+        return f'{url}?page={page}' if page > 1 else url
+
+    factories = {
+        'index': lambda: ('GET', paged(reverse('posts:index')), None),
+        'group': lambda: ('GET', paged(reverse(
+            'posts:group', args=[rng.choice(slugs)])), None),
+        'profile': lambda: ('GET', reverse(
+            'posts:profile', args=[rng.choice(usernames)]), None),
+        'post': lambda: ('GET', post_url('posts:post'), None),
+        'follow': lambda: ('GET', reverse('posts:follow_index'), None),
+        'new_post': lambda: ('POST', reverse('posts:new_post'),
+                             {'text': 'Новый пост под нагрузкой'}),
+        'add_comment': lambda: ('POST', post_url('posts:add_comment'),
+                                {'text': 'Комментарий под нагрузкой'}),
+    }
+    return {name: [factories[name]() for _ in range(count)]
+            for name in ENDPOINTS}
+
+
+def run_inprocess(requests, args, user):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    results = {}
+    for name, calls in requests.items():
+        client = Client()
+        if ENDPOINTS[name][1] or not args.anonymous:
+            client.force_login(user)
+
+        def call(method, path, data):
+            response = getattr(client, method.lower())(path, data)
+            assert response.status_code in (200, 302), (path, response)
+
+        for request in calls[:args.warmup]:
+            call(*request)
+        timings, queries = [], []
+        started = time.perf_counter()
+        for request in calls[args.warmup:]:
+            with CaptureQueriesContext(connection) as captured:
+                began = time.perf_counter()
+                call(*request)
+                timings.append((time.perf_counter() - began) * 1000)
+            queries.append(len(captured))
+        result = latency_summary(timings, time.perf_counter() - started)
+        result['queries_per_request'] = round(statistics.mean(queries), 1)
+        result['max_queries'] = max(queries)
+        # Отдельный короткий прогон: tracemalloc сильно замедляет запросы.
+        tracemalloc.start()
+        peaks = []
+        for request in calls[args.warmup:][:args.memory_samples]:
+            tracemalloc.reset_peak()
+            call(*request)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        result['peak_alloc_kib'] = round(max(peaks) / 1024)
+        results[name] = result
+        print(f'  inprocess {name}: p50 {result["p50_ms"]} ms')
+    return results
+
+
+class _Server:
+    def __init__(self):
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.core.servers.basehttp import (ThreadedWSGIServer,
+                                                  WSGIRequestHandler)
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+        self.httpd.set_app(WSGIHandler())
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def run_server(requests, args, user):
+    from django.test import Client
+
+    server = _Server()
+    # Сессия и CSRF-токен берутся один раз и общие для всех потоков.
+    client = Client()
+    client.force_login(user)
+    cookies = {'sessionid': client.cookies['sessionid'].value}
+    opener = urllib.request.build_opener(_NoRedirect)
+    with opener.open(urllib.request.Request(
+            server.url + '/new/',
+            headers={'Cookie': f'sessionid={cookies["sessionid"]}'})) as page:
+        for header in page.headers.get_all('Set-Cookie'):
+            name, _, rest = header.partition('=')
+            if name == 'csrftoken':
+                cookies['csrftoken'] = rest.split(';')[0]
+
+    def call(method, path, data, logged_in):
+        headers = {}
+        if logged_in:
+            headers['Cookie'] = '; '.join(
+                f'{key}={value}' for key, value in cookies.items())
+            headers['X-CSRFToken'] = cookies['csrftoken']
+        body = urllib.parse.urlencode(data).encode() if data else None
+        request = urllib.request.Request(
+            server.url + path, data=body, method=method, headers=headers)
+        began = time.perf_counter()
+        try:
+            with opener.open(request) as response:
+                response.read()
+        except urllib.error.HTTPError as error:
+            # 302 после POST приходит сюда из-за _NoRedirect.
+            if error.code != 302:
+                return None
+        return (time.perf_counter() - began) * 1000
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            for name, calls in requests.items():
+                logged_in = ENDPOINTS[name][1] or not args.anonymous
+                list(pool.map(lambda request: call(*request, logged_in),
+                              calls[:args.warmup]))
+                started = time.perf_counter()
+                timings = list(pool.map(
+                    lambda request: call(*request, logged_in),
+                    calls[args.warmup:]))
+                results[name] = latency_summary(
+                    [timing for timing in timings if timing is not None],
+                    time.perf_counter() - started)
+                # Ошибки (5xx, «database is locked») не входят в задержки.
+                results[name]['errors'] = timings.count(None)
+                print(f'  server {name}: p50 {results[name]["p50_ms"]} ms')
+    finally:
+        server.stop()
+    return results
+
+
+def print_report(report):
+    header = (f'{"":<22}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+              f'{"req/s":>9}{"SQL":>7}{"KiB":>7}{"errors":>8}')
+    for mode in ('inprocess', 'server'):
+        if mode not in report:
+            continue
+        print(f'\n{mode}')
+        print(header)
+        for name, row in report[mode].items():
+            print(f'{name:<22}{row["p50_ms"]:>9}{row["p95_ms"]:>9}'
+                  f'{row["p99_ms"]:>9}{row["rps"]:>9}'
+                  f'{row.get("queries_per_request", ""):>7}'
+                  f'{row.get("peak_alloc_kib", ""):>7}'
+                  f'{row.get("errors", ""):>8}')
+    print(f'\nmax RSS: {report["max_rss_mib"]} MiB')
+
+
+def compare(old_path, new_path):
+    with open(old_path) as file:
+        old = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    print(f'{old["meta"]["commit"]} -> {new["meta"]["commit"]}')
+    for mode in ('inprocess', 'server'):
+        if mode not in old or mode not in new:
+            continue
+        print(f'\n{mode}')
+        print(f'{"":<22}{"p50":>16}{"p95":>16}{"SQL":>12}')
+        for name, row in new[mode].items():
+            before = old[mode].get(name)
+            if before is None:
+                continue
+            cells = []
+            for key in ('p50_ms', 'p95_ms'):
+                change = (row[key] - before[key]) / before[key]
+                cells.append(f'{row[key]:>8} {change:>+6.0%} ')
+            queries = ''
+            if 'queries_per_request' in row:
+                queries = (f'{before["queries_per_request"]}->'
+                           f'{row["queries_per_request"]}')
+            print(f'{name:<22}{cells[0]:>16}{cells[1]:>16}{queries:>12}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--groups', type=int, default=10)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments-per-post', type=int, default=3)
+    parser.add_argument('--follows-per-user', type=int, default=10)
+    parser.add_argument('--image-share', type=float, default=0.2,
+                        help='Доля постов с картинкой.')
+    parser.add_argument('--distinct-images', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Замеряемых запросов на сценарий.')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--memory-samples', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mode', choices=('inprocess', 'server', 'both'),
+                        default='both')
+    parser.add_argument('--anonymous', action='store_true')
+    parser.add_argument('--sqlite-production', action='store_true',
+                        help='Профиль БД SQLITE_PRODUCTION.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    database = os.path.join(
+        tempfile.mkdtemp(prefix='yatube-load-'), 'db.sqlite3')
+    setup_django(database=database,
+                 sqlite_production=args.sqlite_production, DEBUG=False)
+
+    import django
+    from posts.models import User
+
+    print('Данные...')
+    dataset = seed(args)
+    print('  ' + ', '.join(f'{key}: {value}'
+                           for key, value in dataset.items()))
+    requests = make_requests(args)
+    user = User.objects.order_by('pk').first()
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'args': vars(args),
+        },
+        'dataset': dataset,
+    }
+    if args.mode in ('inprocess', 'both'):
+        report['inprocess'] = run_inprocess(requests, args, user)
+    if args.mode in ('server', 'both'):
+        report['server'] = run_server(requests, args, user)
+    report['max_rss_mib'] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print_report(report)
+
+    output = args.output or os.path.join(
+        ROOT_DIR, 'benchmarks', 'results', f'{report["meta"]["commit"]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f'Результаты: {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Время отрисовки страницы ленты из 10 постов с холодным и тёплым кешем
+карточек.
+
+    python benchmarks/post_card_render.py [--repeat 30]
+
+Запросы идут от авторизованного пользователя, поэтому кеш целых
+страниц для анонимов не участвует — меряется именно кеш карточек.
+"""
+import argparse
+
+from common import measure, make_image, print_table, setup_django, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django(PAGES=10)
+
+    from django.core.cache import cache
+    from django.test import Client
+
+    from posts.models import Comment, Group, Post, User
+
+    author = User.objects.create_user(username='author')
+    reader = User.objects.create_user(username='reader')
+    group = Group.objects.create(
+        title='Бенчмарк', slug='bench', description='Группа для замеров')
+    for number in range(10):
+        post = Post.objects.create(
+            text=f'Пост номер {number} ' * 20, author=author, group=group,
+            image=make_image(f'photo{number}.jpg'))
+        for _ in range(3):
+            Comment.objects.create(post=post, author=reader, text='Ок')
+
+    client = Client()
+    client.force_login(reader)
+
+    def render_index():
+        response = client.get('/')
+        assert response.status_code == 200
+
+    rows = {
+        'first render (thumbnails)': summary(measure(render_index, 1)),
+        'cold card cache': summary(
+            measure(render_index, args.repeat, before=cache.clear)),
+        'warm card cache': summary(measure(render_index, args.repeat)),
+    }
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
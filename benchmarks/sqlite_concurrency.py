@@ -0,0 +1,119 @@
+"""Пропускная способность SQLite при конкурентных чтениях и записях:
+штатный бэкенд против профиля SQLITE_PRODUCTION (posts.backends.sqlite3).
+
+    python benchmarks/sqlite_concurrency.py [--threads 8] [--seconds 5]
+
+Каждый поток, как отдельный запрос, либо читает страницу ленты, либо
+(с вероятностью --writes) в транзакции находит пост и добавляет к нему
+комментарий, как add_comment. После каждой операции соединение
+закрывается так же, как в конце запроса (с учётом CONN_MAX_AGE). Каждый
+профиль работает с новым файлом базы в отдельном процессе.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import PROJECT_DIR
+
+PROFILES = ('default', 'production')
+
+
+def run_profile(profile, threads, seconds, writes):
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    from django.conf import settings
+
+    path = os.path.join(tempfile.mkdtemp(prefix='yatube-bench-'), 'db.sqlite3')
+    if profile == 'production':
+        settings.DATABASES['default'] = {
+            **settings.SQLITE_PRODUCTION, 'NAME': path}
+    else:
+        settings.DATABASES['default'] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}
+    settings.MEDIA_ROOT = os.path.dirname(path)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import close_old_connections, transaction
+    from django.db.utils import OperationalError
+
+    from posts.models import Comment, Post, User
+
+    call_command('migrate', verbosity=0)
+    author = User.objects.create_user(username='author')
+    Post.objects.bulk_create(
+        Post(text=f'Пост номер {number}', author=author)
+        for number in range(200))
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    close_old_connections()
+
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def read():
+        list(Post.objects.for_feed()[:10])
+
+    def write():
+        with transaction.atomic():
+            post = Post.objects.get(pk=random.choice(post_ids))
+            Comment.objects.create(post=post, author=author, text='Текст')
+
+    def worker():
+        while time.monotonic() < deadline:
+            kind = 'writes' if random.random() < writes else 'reads'
+            try:
+                write() if kind == 'writes' else read()
+            except OperationalError:
+                kind = 'errors'
+            finally:
+                close_old_connections()
+            with lock:
+                counts[kind] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return {kind: count / seconds for kind, count in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writes', type=float, default=0.2,
+                        help='Доля операций записи.')
+    parser.add_argument('--profile', choices=PROFILES,
+                        help='Запустить один профиль и вывести JSON.')
+    args = parser.parse_args()
+    if args.profile:
+        print(json.dumps(run_profile(
+            args.profile, args.threads, args.seconds, args.writes)))
+        return
+
+    print(f'{args.threads} потоков, {args.seconds:g} с, '
+          f'записей {args.writes:.0%}')
+    print(f'{"":<14}{"reads/s":>10}{"writes/s":>10}{"errors/s":>10}')
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, __file__, '--profile', profile,
+             '--threads', str(args.threads), '--seconds', str(args.seconds),
+             '--writes', str(args.writes)],
+            check=True, stdout=subprocess.PIPE, text=True).stdout
+        row = json.loads(output.strip().splitlines()[-1])
+        print(f'{profile:<14}{row["reads"]:>10.0f}{row["writes"]:>10.0f}'
+              f'{row["errors"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,38 @@
 from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
 
-from .models import Comment, Follow, Group, Post
+from . import search
+from .models import Comment, Follow, Group, Post, Task
+from .paginators import EstimatedCountPaginator
 
+User = get_user_model()
 
-class PostAdmin(admin.ModelAdmin):
+
+class FastChangeListMixin:
+    """Списки в админке для больших таблиц: оценка числа строк вместо
+    COUNT(*) и без второго подсчёта «всего» при фильтрах."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PostAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author')
+    list_select_related = ('author',)
     search_fields = ('text',)
+    # Фильтр по диапазону дат и сортировка по индексу post_date_idx.
     list_filter = ('pub_date',)
+    autocomplete_fields = ('author', 'group')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Полнотекстовый индекс вместо LIKE '%...%' по всей таблице.
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'slug')
@@ -17,20 +41,61 @@ class GroupAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('title',)}
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ('pk', 'post', 'author', 'text')
+    list_select_related = ('post', 'author')
     search_fields = ('text',)
+    # Фильтр по диапазону дат и сортировка по индексу
+    # comment_created_idx.
     list_filter = ('created',)
+    ordering = ('-created', '-id')
+    autocomplete_fields = ('post', 'author')
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ('pk', 'user', 'author',)
-    search_fields = ('author',)
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Ищется начало имени подписчика или автора без учёта регистра
+        # («tolst» найдёт Tolstoy), а не подстрока, как в поиске админки
+        # по умолчанию: по таблице пользователей, затем подписки по
+        # индексам (user, author) и (author, user) вместо LIKE '%...%'
+        # через два JOIN.
+        if not search_term:
+            return queryset, False
+        users = User.objects.filter(
+            username__istartswith=search_term).values('pk')
+        return queryset.filter(Q(user__in=users) | Q(author__in=users)), False
+
+
+class TaskAdmin(FastChangeListMixin, admin.ModelAdmin):
+    list_display = ('pk', 'name', 'args', 'status', 'attempts', 'run_at')
+    list_filter = ('status',)
+    # Список по индексу task_status_run_at_idx.
+    ordering = ('status', 'run_at')
+    readonly_fields = ('last_error',)
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        for task in queryset.filter(status=Task.FAILED):
+            try:
+                with transaction.atomic():
+                    Task.objects.filter(pk=task.pk).update(
+                        status=Task.QUEUED, attempts=0,
+                        run_at=timezone.now())
+            except IntegrityError:
+                # Такая же задача уже в очереди.
+                task.delete()
+    retry.short_description = 'Повторить невыполненные задачи'
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(Task, TaskAdmin)
@@ -0,0 +1,201 @@
+"""JSON API для чтения: посты, группы, профили, комментарии и лента
+подписок (``/api/``).
+
+Списки — ``{"results": [...], "next": курсор}``; следующая страница —
+``?after=<next>``, размер — ``?limit=`` до ``API_MAX_LIMIT``. Списки
+отдаются потоком: объекты читаются из базы итератором и
+сериализуются частями, поэтому большие страницы не собираются в памяти
+целиком. Сериализует orjson, если он установлен, иначе ``json``.
+
+У ответов есть ``ETag`` и ``Last-Modified`` по версиям тегов кеша
+страниц (``posts.page_cache.conditional``), поэтому неизменившаяся
+лента отдаётся как 304 без запросов к базе.
+"""
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from . import timeline
+from .models import Group, Post, User, UserStats
+from .page_cache import conditional
+from .paginators import CursorPaginator
+from .replicas import replica_reads
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CONTENT_TYPE = 'application/json'
+# Сколько объектов сериализовать в одну часть потокового ответа.
+STREAM_CHUNK = 100
+
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(
+        value, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def json_response(value, status=200):
+    return HttpResponse(dumps(value), content_type=CONTENT_TYPE,
+                        status=status)
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'thumbnails': post.thumbnail_urls,
+        'comment_count': post.comment_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def serialize_group(group):
+    return {'slug': group.slug, 'title': group.title,
+            'description': group.description}
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.PAGES))
+    except ValueError:
+        limit = settings.PAGES
+    return max(1, min(limit, settings.API_MAX_LIMIT))
+
+
+def _stream(paginator, after, serialize):
+    yield b'{"results":['
+    parts, last, has_next, separator = [], None, False, b''
+    for number, obj in enumerate(paginator.iterate(after)):
+        if number == paginator.per_page:
+            has_next = True
+            break
+        parts.append(dumps(serialize(obj)))
+        last = obj
+        if len(parts) == STREAM_CHUNK:
+            yield separator + b','.join(parts)
+            parts, separator = [], b','
+    if parts:
+        yield separator + b','.join(parts)
+    cursor = paginator.encode_cursor(last) if has_next else None
+    yield b'],"next":' + dumps(cursor) + b'}'
+
+
+def stream_list(request, queryset, serialize, ordering=('-pub_date', '-id')):
+    """Страница ``queryset`` потоковым JSON-ответом."""
+    # База выбирается сейчас: поток читается уже после выхода из view и
+    # из replica_reads.
+    queryset = queryset.using(queryset.db)
+    paginator = CursorPaginator(queryset, _limit(request), ordering)
+    return StreamingHttpResponse(
+        _stream(paginator, request.GET.get('after'), serialize),
+        content_type=CONTENT_TYPE)
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request: ['feed', 'groups'])
+def posts(request):
+    return stream_list(request, Post.objects.for_feed(), serialize_post)
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request, post_id: [f'post:{post_id}', 'groups'])
+def post(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    return json_response(serialize_post(post))
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request, post_id: [f'post:{post_id}'])
+def comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return stream_list(
+        request, post.comments.select_related('author'), serialize_comment,
+        ordering=('created', 'id'))
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request: ['groups'])
+def groups(request):
+    return stream_list(request, Group.objects.all(), serialize_group,
+                       ordering=('id',))
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request, slug: [f'group:{slug}', 'groups'])
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return stream_list(request, group.posts.for_feed(), serialize_post)
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request, username: [f'author:{username}'])
+def user(request, username):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    stats = UserStats.objects.for_user(author)
+    return json_response({
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        'post_count': stats.post_count,
+        'comment_count': stats.comment_count,
+        'follower_count': stats.follower_count,
+        'following_count': stats.following_count,
+    })
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request, username: [f'author:{username}', 'groups'])
+def user_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return stream_list(request, author.posts.for_feed(), serialize_post)
+
+
+def _follow_tags(request):
+    authors = User.objects.filter(
+        following__user=request.user).values_list('username', flat=True)
+    return [f'author:{username}'
+            for username in [request.user.username, *authors]] + ['groups']
+
+
+@require_safe
+@replica_reads
+def follow(request):
+    if not request.user.is_authenticated:
+        return json_response({'detail': 'Нужно войти.'}, status=403)
+    return _follow(request)
+
+
+@conditional(_follow_tags, per_user=True)
+def _follow(request):
+    if timeline.is_enabled():
+        post_list = timeline.feed(request.user.pk)
+    else:
+        post_list = Post.objects.for_feed().filter(
+            author__following__user=request.user)
+    return stream_list(request, post_list, serialize_post)
@@ -0,0 +1,189 @@
+"""ASGI-приложение поверх обработчика запросов Django.
+
+Django 2.2 не умеет ни async views, ни async ORM, поэтому приложение
+принимает соединения, заголовки и тело запроса в цикле событий, а сами
+views выполняет в пулах потоков: цикл событий никогда не ждёт базу,
+кеш или картинки. Медленный клиент занимает корутину, а не поток.
+GET и HEAD к лентам и страницам из ``ASGI_READ_VIEWS`` идут в отдельный
+пул ``ASGI_READ_THREADS``, чтобы долгие записи (загрузка картинок,
+импорт) не задерживали чтение; остальное — в пул ``ASGI_THREADS``.
+
+Ответ, в том числе потоковый, отдаётся по частям из того же потока, где
+его сделал view: соединения с базой привязаны к потоку и закрываются в
+нём по сигналу ``request_finished``.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import Resolver404, resolve
+
+# Сколько частей ответа может ждать отправки; дальше поток view ждёт
+# медленного клиента.
+RESPONSE_QUEUE_SIZE = 8
+_END = object()
+
+
+def _wsgi_string(value):
+    # Строки WSGI — байты в latin-1 (PEP 3333).
+    return value.encode().decode('latin-1')
+
+
+def build_environ(scope, body):
+    """WSGI environ для HTTP-запроса ASGI ``scope`` с телом ``body``."""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': _wsgi_string(scope.get('root_path', '')),
+        'PATH_INFO': _wsgi_string(scope['path']),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        if name in environ:
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = environ[name] + separator + value
+        environ[name] = value
+    if body is not None and 'CONTENT_LENGTH' not in environ:
+        # Тело chunked-запроса уже собрано, а Django читает ровно
+        # CONTENT_LENGTH байт.
+        environ['CONTENT_LENGTH'] = str(body.seek(0, os.SEEK_END))
+        body.seek(0)
+    return environ
+
+
+class AsgiHandler:
+    def __init__(self):
+        self.wsgi_handler = WSGIHandler()
+        self.read_views = frozenset(settings.ASGI_READ_VIEWS)
+        self.read_pool = ThreadPoolExecutor(
+            settings.ASGI_READ_THREADS, thread_name_prefix='asgi-read')
+        self.pool = ThreadPoolExecutor(
+            settings.ASGI_THREADS, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.read_pool.shutdown(wait=False)
+                self.pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def pool_for(self, scope):
+        if scope['method'] not in ('GET', 'HEAD'):
+            return self.pool
+        try:
+            match = resolve(scope['path'])
+        except Resolver404:
+            return self.pool
+        if match.view_name in self.read_views:
+            return self.read_pool
+        return self.pool
+
+    async def read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(RESPONSE_QUEUE_SIZE)
+        worker = loop.run_in_executor(
+            self.pool_for(scope), self.respond,
+            build_environ(scope, body), queue, loop)
+        item = None
+        try:
+            item = await queue.get()
+            if item is _END:
+                # View упал раньше, чем начал ответ.
+                return await worker
+            status, headers = item
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                # У Set-Cookie из WSGIHandler в начале пробел.
+                'headers': [(name.lower().encode('latin-1'),
+                             value.strip().encode('latin-1'))
+                            for name, value in headers],
+            })
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    break
+                await send({'type': 'http.response.body', 'body': item,
+                            'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Клиент мог уйти: дочитать очередь, чтобы поток закрыл ответ.
+            while item is not _END:
+                item = await queue.get()
+            body.close()
+        await worker
+
+    def respond(self, environ, queue, loop):
+        """Выполнить view и передать в ``queue`` статус с заголовками,
+        части тела и ``_END`` (в потоке пула)."""
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            put((int(status.split(' ', 1)[0]), headers))
+
+        try:
+            response = self.wsgi_handler(environ, start_response)
+            try:
+                for chunk in response:
+                    if chunk:
+                        put(chunk)
+            finally:
+                # Сигнал request_finished закрывает соединения этого потока.
+                response.close()
+        finally:
+            put(_END)
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return AsgiHandler()
@@ -0,0 +1,92 @@
+"""SQLite для продакшена.
+
+Поверх штатного бэкенда:
+
+* каждое новое соединение получает прагмы ``DEFAULT_PRAGMAS``
+  (дополняются ``OPTIONS['pragmas']``): WAL, чтобы чтение не ждало
+  записи, ``synchronous=NORMAL`` (в WAL не теряет целостность при сбое),
+  кеш страниц, mmap и ``busy_timeout``;
+* транзакции начинаются ``BEGIN IMMEDIATE``: блокировка записи берётся
+  сразу, пока ожидание ещё помогает. Отложенная транзакция, которая
+  сначала читала, а потом пишет, при конкурентной записи получает
+  «database is locked» без всякого ожидания;
+* если база занята дольше ``busy_timeout``, начало транзакции и
+  запросы вне транзакций повторяются ``OPTIONS['write_retries']`` раз
+  с экспоненциальной паузой от ``OPTIONS['retry_backoff']`` секунд.
+  Запрос внутри начатой транзакции не повторяется: её пришлось бы
+  начинать заново.
+
+Постоянные соединения включаются штатным ``CONN_MAX_AGE``.
+"""
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+
+Database = base.Database
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    # Отрицательное значение — в КиБ: 64 МиБ на соединение.
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+}
+
+
+def _is_locked(error):
+    return 'locked' in str(error)
+
+
+class RetryingCursor(base.SQLiteCursorWrapper):
+    retries = 0
+    backoff = 0
+
+    def _retry(self, method, *args):
+        attempt = 0
+        while True:
+            try:
+                return method(self, *args)
+            except Database.OperationalError as error:
+                if (not _is_locked(error) or attempt >= self.retries
+                        or self.connection.in_transaction):
+                    raise
+            # Случайная добавка, чтобы ждущие не просыпались разом.
+            time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+    def execute(self, query, params=None):
+        return self._retry(base.SQLiteCursorWrapper.execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retry(
+            base.SQLiteCursorWrapper.executemany, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        self.write_retries = options.get('write_retries', 5)
+        self.retry_backoff = options.get('retry_backoff', 0.02)
+        params = super().get_connection_params()
+        for name in ('pragmas', 'write_retries', 'retry_backoff'):
+            params.pop(name, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursor)
+        cursor.retries = self.write_retries
+        cursor.backoff = self.retry_backoff
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
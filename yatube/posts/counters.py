@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Sum
+
+from . import timeline
+from .models import Post, UserStats
+
+
+def _key(scope):
+    return f'posts:count:{scope}'
+
+
+def post_scopes(post):
+    """Кешируемые области, в чьи счётчики входит пост."""
+    scopes = ['all']
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group_id}')
+    return scopes
+
+
+def _count_posts(scope):
+    # По основной базе: число с отстающей реплики задержалось бы в кеше.
+    posts = Post.objects.using(DEFAULT_DB_ALIAS)
+    if scope == 'all':
+        return posts.count()
+    return posts.filter(group_id=scope.split(':')[1]).count()
+
+
+def post_count(scope):
+    """Число постов в области: 'all', 'group:<id>', 'author:<id>',
+    'follow:<user_id>' или 'timeline:<user_id>'.
+
+    Авторы и ленты подписок считаются по UserStats, общая лента и
+    группы — по счётчикам в кеше.
+    """
+    kind, _, pk = scope.partition(':')
+    if kind == 'author':
+        count = UserStats.objects.filter(user_id=pk).values_list(
+            'post_count', flat=True).first()
+        if count is None:
+            stats = UserStats.objects.rebuild([pk])
+            count = stats[0].post_count if stats else 0
+        return count
+    if kind == 'timeline':
+        return timeline.count(pk)
+    if kind == 'follow':
+        return UserStats.objects.filter(
+            user__following__user_id=pk
+        ).aggregate(total=Sum('post_count'))['total'] or 0
+    key = _key(scope)
+    count = cache.get(key)
+    if count is None:
+        count = _count_posts(scope)
+        cache.set(key, count, settings.POST_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def _incr(scopes, delta):
+    for scope in scopes:
+        try:
+            cache.incr(_key(scope), delta)
+        except ValueError:
+            # Счётчика ещё нет в кеше — посчитается при первом чтении.
+            pass
+
+
+def update_counts(scopes, delta):
+    """Сдвинуть счётчики областей на ``delta`` после коммита; при откате
+    транзакции они не меняются."""
+    transaction.on_commit(lambda: _incr(scopes, delta))
+
+
+def forget(scopes):
+    """Сбросить счётчики областей ``scopes``; они посчитаются заново при
+    первом чтении."""
+    cache.delete_many([_key(scope) for scope in scopes])
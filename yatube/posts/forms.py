@@ -1,6 +1,6 @@
 from django import forms
 
-from .models import Comment, Post
+from .models import Comment, Group, Post, User
 
 
 class PostForm(forms.ModelForm):
@@ -25,3 +25,20 @@ class CommentForm(forms.ModelForm):
         fields = ('text',)
         labels = {'text': 'Текст комментария'}
         help_texts = {'text': 'Напишите свой комментарий!'}
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Что ищем', max_length=200)
+    group = forms.ModelChoiceField(
+        label='Группа', queryset=Group.objects.all(), to_field_name='slug',
+        required=False, empty_label='Все группы')
+    author = forms.CharField(label='Автор', max_length=150, required=False)
+
+    def clean_author(self):
+        username = self.cleaned_data['author']
+        if not username:
+            return None
+        author = User.objects.filter(username=username).first()
+        if author is None:
+            raise forms.ValidationError('Нет такого автора')
+        return author
@@ -0,0 +1,173 @@
+"""Обработка загруженных картинок постов вне запроса.
+
+Новая загрузка не пишется сразу в ``posts/``: сигнал ``pre_save``
+откладывает её во временную папку ``IMAGE_STAGING_ROOT`` и запоминает
+имя в ``Post.pending_image``, а пост до конца обработки показывает
+заглушку. Фоновая задача в пуле процессов декодирует картинку,
+поворачивает по EXIF, отбрасывает метаданные, уменьшает до
+``IMAGE_MAX_SIZE`` и перекодирует; результат сохраняется в
+``Post.image``.
+
+Файл картинки может быть общим у нескольких постов (см.
+``posts.storage``), поэтому ставший ненужным файл удаляет ``release``
+после коммита, проверив, что на него больше никто не ссылается.
+"""
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from PIL import Image, ImageOps
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from . import page_cache, thumbnails, workers
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Форматы, которые сохраняются как есть; остальное перекодируется в
+# JPEG или, если есть прозрачность, в PNG.
+KEEP_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS)
+    return _pool
+
+
+def staging_storage():
+    return FileSystemStorage(location=settings.IMAGE_STAGING_ROOT)
+
+
+def stage(post, old_image):
+    """Отложить новую загрузку ``post.image`` до обработки.
+
+    Имя отложенного файла попадает в ``post.pending_image``, а
+    ``post.image`` до конца обработки остаётся прежним, ``old_image``.
+    Возвращает ``True``, если загрузка была.
+    """
+    image = post.image
+    if not image or image._committed:
+        return False
+    name = f'{uuid.uuid4().hex}-{os.path.basename(image.name)}'
+    post.pending_image = staging_storage().save(name, image.file)
+    post.image = old_image
+    return True
+
+
+def process_file(path, max_size, quality):
+    """Вернуть ``(расширение, байты)`` очищенной и уменьшенной картинки.
+
+    Работает в дочернем процессе, поэтому получает всё аргументами.
+    """
+    with Image.open(path) as image:
+        source_format = image.format
+        animated = getattr(image, 'is_animated', False)
+        if (animated and source_format in KEEP_FORMATS
+                and max(image.size) <= max_size):
+            # У GIF нет EXIF, а перекодирование потеряет анимацию.
+            # Многостраничные TIFF, MPO и т.п. перекодируются по первому
+            # кадру.
+            with open(path, 'rb') as file:
+                return KEEP_FORMATS[source_format], file.read()
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        if source_format in KEEP_FORMATS:
+            output_format = source_format
+        elif image.mode in ('RGBA', 'LA', 'P'):
+            output_format = 'PNG'
+        else:
+            output_format = 'JPEG'
+        if output_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        # Метаданные не передаются в save() и в файл не попадают.
+        options = {'optimize': True}
+        if output_format in ('JPEG', 'WEBP'):
+            options['quality'] = quality
+        image.save(buffer, output_format, **options)
+    return KEEP_FORMATS[output_format], buffer.getvalue()
+
+
+def _process(path):
+    args = (path, settings.IMAGE_MAX_SIZE, settings.IMAGE_QUALITY)
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        return process_file(*args)
+    return _get_pool().submit(process_file, *args).result()
+
+
+def _discard(post_id, staged_name):
+    Post.objects.filter(
+        pk=post_id, pending_image=staged_name).update(pending_image='')
+
+
+def ingest(post_id, staged_name):
+    """Обработать отложенную картинку и записать её в пост."""
+    storage = staging_storage()
+    try:
+        try:
+            extension, content = _process(storage.path(staged_name))
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.warning('Картинка %s поста %s не обработана',
+                           staged_name, post_id, exc_info=True)
+            _discard(post_id, staged_name)
+            return
+        except Exception:
+            # Иначе пост навсегда остался бы с заглушкой, а отложенный
+            # файл всё равно удаляется.
+            logger.exception('Ошибка обработки картинки %s поста %s',
+                             staged_name, post_id)
+            _discard(post_id, staged_name)
+            return
+        post = Post.objects.select_related('author').filter(
+            pk=post_id, pending_image=staged_name).first()
+        if post is None:
+            # Пост удалён или картинку уже заменили.
+            return
+        original = staged_name.split('-', 1)[1]
+        name = os.path.splitext(original)[0] + extension
+        field = Post._meta.get_field('image')
+        stored = field.storage.save(
+            field.generate_filename(post, name), ContentFile(content))
+        updated = Post.objects.filter(
+            pk=post_id, pending_image=staged_name
+        ).update(image=stored, pending_image='', thumbnails='')
+        if not updated:
+            schedule_release(stored)
+            return
+        if not field.storage.exists(stored):
+            # Такой же файл мог удалить release() другого поста, пока
+            # этот ещё не ссылался на него.
+            field.storage.save(stored, ContentFile(content))
+        if post.image.name != stored:
+            schedule_release(post.image.name)
+        thumbnails.generate(post_id)
+        page_cache.bump_post(post)
+    finally:
+        storage.delete(staged_name)
+
+
+def release(name):
+    """Удалить файл картинки ``name`` и его миниатюры, если на него не
+    ссылается ни один пост."""
+    if not name or Post.objects.filter(image=name).exists():
+        return
+    image = ImageFile(name, Post._meta.get_field('image').storage)
+    default.kvstore.delete(image)
+    image.delete()
+
+
+def schedule_release(name):
+    if name:
+        transaction.on_commit(lambda: workers.submit(release, name))
@@ -0,0 +1,131 @@
+"""Хранилище метаданных миниатюр sorl-thumbnail.
+
+Поверх штатного cached-DB хранилища лежит ограниченный LRU в памяти
+процесса, так что повторные рендеры не ходят ни в кеш, ни в базу.
+Любая запись увеличивает общее для всех процессов поколение в кеше
+Django; процесс, заметив новое поколение, очищает свой LRU. Поколение
+проверяется в начале каждого запроса и не реже раза в
+``THUMBNAIL_LRU_CHECK_INTERVAL`` секунд вне запросов.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import request_started
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+GENERATION_KEY = 'posts:thumbnail_kvstore:generation'
+EMPTY_VALUE = cached_db_kvstore.EMPTY_VALUE
+
+_request_epoch = 0
+
+
+def _new_request(**kwargs):
+    global _request_epoch
+    _request_epoch += 1
+
+
+request_started.connect(_new_request)
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    def __init__(self):
+        super().__init__()
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked_at = None
+        self._checked_epoch = None
+
+    def _sync(self):
+        now = time.monotonic()
+        if (self._checked_epoch == _request_epoch
+                and now - self._checked_at
+                < settings.THUMBNAIL_LRU_CHECK_INTERVAL):
+            return
+        generation = self.cache.get(GENERATION_KEY)
+        if generation is None:
+            # Не 1: после сброса кеша поколение не должно совпасть со
+            # старым.
+            self.cache.add(GENERATION_KEY, time.time_ns(), None)
+            generation = self.cache.get(GENERATION_KEY)
+        with self._lock:
+            if generation != self._generation:
+                self._lru.clear()
+                self._generation = generation
+            self._checked_at = now
+            self._checked_epoch = _request_epoch
+
+    def _bump_generation(self):
+        try:
+            self.cache.incr(GENERATION_KEY)
+        except ValueError:
+            self.cache.set(GENERATION_KEY, time.time_ns(), None)
+        with self._lock:
+            self._lru.clear()
+        # Следующее чтение заберёт новое поколение.
+        self._checked_epoch = None
+
+    def _remember(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._lru[key] = value
+                self._lru.move_to_end(key)
+            while len(self._lru) > settings.THUMBNAIL_LRU_SIZE:
+                self._lru.popitem(last=False)
+
+    def _get_many_raw(self, keys):
+        """Значения ключей ``keys``: из LRU, затем одним запросом к кешу и
+        одним к базе для оставшихся."""
+        self._sync()
+        values = {}
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    values[key] = self._lru[key]
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = self.cache.get_many(missing)
+            missing = [key for key in missing if key not in found]
+            if missing:
+                from_db = dict(KVStoreModel.objects.filter(
+                    key__in=missing).values_list('key', 'value'))
+                from_db = {key: from_db.get(key, EMPTY_VALUE)
+                           for key in missing}
+                self.cache.set_many(
+                    from_db, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+                found.update(from_db)
+            self._remember(found)
+            values.update(found)
+        return {key: None if value == EMPTY_VALUE else value
+                for key, value in values.items()}
+
+    def get_many(self, image_files):
+        """Вернуть ``{image_file.key: ImageFile или None}`` для всех
+        ``image_files`` разом."""
+        raw_keys = {add_prefix(image_file.key): image_file.key
+                    for image_file in image_files}
+        values = self._get_many_raw(list(raw_keys))
+        return {raw_keys[key]: deserialize_image_file(value) if value else None
+                for key, value in values.items()}
+
+    def _get_raw(self, key):
+        return self._get_many_raw([key])[key]
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self._bump_generation()
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self._bump_generation()
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        self._bump_generation()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import images, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов, загруженные до хранилища по '
+            'содержимому, под имена по sha256 и удаляет дубликаты.')
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = (Post.objects.exclude(image='').exclude(image=None)
+                 .values_list('image', flat=True).distinct())
+        moved = 0
+        for name in list(names):
+            if storage.is_content_name(name) or not storage.exists(name):
+                continue
+            with storage.open(name) as file:
+                new_name = storage.save(name, file)
+            post_ids = list(Post.objects.filter(
+                image=name).values_list('pk', flat=True))
+            Post.objects.filter(pk__in=post_ids).update(
+                image=new_name, thumbnails='')
+            images.release(name)
+            for post_id in post_ids:
+                thumbnails.generate(post_id)
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {moved}, '
+            f'уникальных картинок: {names.count()}.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в папку '
+            'файлами JSON Lines или CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Папка для файлов выгрузки.')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='jsonl')
+        parser.add_argument(
+            '--images', metavar='DIR',
+            help='Скопировать сюда файлы картинок постов.')
+
+    def report(self, kind, rows, seconds):
+        rate = rows / seconds if seconds else rows
+        self.stdout.write(f'{kind}: {rows} строк за {seconds:.1f} с, '
+                          f'{rate:.0f} строк/с')
+
+    def handle(self, *args, **options):
+        transfer.export(options['directory'], options['format'],
+                        options['images'], report=self.report)
+        self.stdout.write(self.style.SUCCESS('Выгрузка готова.'))
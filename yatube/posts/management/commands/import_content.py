@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает группы, посты, комментарии и подписки из папки '
+            'выгрузки. После сбоя запустите команду ещё раз с теми же '
+            'параметрами: загрузка продолжится с места остановки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Папка с файлами выгрузки.')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='jsonl')
+        parser.add_argument(
+            '--images', metavar='DIR',
+            help='Папка с картинками, пути к которым указаны в постах.')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Строк в одной транзакции.')
+        parser.add_argument(
+            '--state', metavar='FILE',
+            help='Файл состояния загрузки; по умолчанию '
+                 'import_state.json в папке выгрузки.')
+
+    def report(self, kind, rows, seconds):
+        rate = rows / seconds if seconds else rows
+        self.stdout.write(f'{kind}: {rows} строк за {seconds:.1f} с, '
+                          f'{rate:.0f} строк/с')
+
+    def handle(self, *args, **options):
+        try:
+            skipped = transfer.Importer(
+                options['directory'], options['format'], options['images'],
+                options['batch_size'], options['state'], report=self.report,
+            ).run()
+        except transfer.ImportConflict as error:
+            raise CommandError(error)
+        for kind, count in skipped.items():
+            if count:
+                self.stderr.write(f'{kind}: пропущено {count} строк')
+        self.stdout.write(self.style.SUCCESS('Загрузка готова.'))
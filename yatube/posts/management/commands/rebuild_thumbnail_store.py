@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+from posts.thumbnails import thumbnail_file
+
+
+def _image_size(storage, name):
+    # Image.open читает только заголовок файла, пиксели не декодируются.
+    with storage.open(name) as file, Image.open(file) as image:
+        return image.size
+
+
+def _stored_names(storage, prefix):
+    names = set()
+    directories = [prefix]
+    while directories:
+        directory = directories.pop()
+        try:
+            subdirectories, files = storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        directories += [f'{directory}/{name}' for name in subdirectories]
+        names.update(f'{directory}/{name}' for name in files)
+    return names
+
+
+class Command(BaseCommand):
+    help = ('Восстанавливает метаданные миниатюр постов по файлам в '
+            'media/cache/, не пересоздавая их.')
+
+    def handle(self, *args, **options):
+        kvstore = default.kvstore
+        prefix = sorl_settings.THUMBNAIL_PREFIX.rstrip('/')
+        stored = _stored_names(default.storage, prefix)
+        image_storage = Post._meta.get_field('image').storage
+        restored = 0
+        posts = Post.objects.exclude(image='').exclude(image=None)
+        for image in posts.values_list('image', flat=True).iterator():
+            source = ImageFile(image, image_storage)
+            thumbnails = []
+            for geometry, options in settings.POST_THUMBNAILS.values():
+                thumbnail = thumbnail_file(source, geometry, options)
+                if thumbnail.name in stored:
+                    thumbnails.append(thumbnail)
+            if not thumbnails:
+                continue
+            try:
+                source.set_size(_image_size(source.storage, source.name))
+            except OSError:
+                continue
+            kvstore.get_or_set(source)
+            for thumbnail in thumbnails:
+                thumbnail.set_size(
+                    _image_size(thumbnail.storage, thumbnail.name))
+                kvstore.set(thumbnail, source)
+                restored += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Восстановлено миниатюр: {restored}, '
+            f'файлов в {prefix}/: {len(stored)}.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import User, UserStats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает UserStats по таблицам постов, комментариев '
+            'и подписок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пересчитать только этих пользователей.')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = User.objects.filter(
+                username__in=options['usernames']).values_list('pk', flat=True)
+        stats = UserStats.objects.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитана статистика {len(stats)} пользователей.'))
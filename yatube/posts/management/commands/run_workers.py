@@ -0,0 +1,78 @@
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import metrics
+from posts.models import Task
+from posts.workers import Worker
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', metrics.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди в базе '
+            '(TASK_BACKEND = posts.workers.DatabaseBackend).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--poll', type=float, default=1,
+            help='Через сколько секунд проверять пустую очередь снова.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выйти, когда очередь опустеет.')
+        parser.add_argument(
+            '--metrics-port', type=int,
+            help='Отдавать метрики задач для Prometheus на этом порту '
+                 '(нужен METRICS_ENABLED).')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1:
+            raise CommandError('Нужен хотя бы один поток.')
+        if options['metrics_port']:
+            if not settings.METRICS_ENABLED:
+                raise CommandError('Метрики выключены: METRICS_ENABLED.')
+            server = ThreadingHTTPServer(
+                ('', options['metrics_port']), MetricsHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        stop = threading.Event()
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                # Доделать начатые задачи и выйти.
+                handlers[signum] = signal.signal(
+                    signum, lambda *args: stop.set())
+        threads = [
+            threading.Thread(
+                target=Worker().run,
+                args=(stop, options['poll'], options['once']),
+                name=f'run-workers-{number}')
+            for number in range(options['threads'])]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        failed = Task.objects.filter(status=Task.FAILED).count()
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f'Не выполнено задач: {failed}.'))
+        self.stdout.write(self.style.SUCCESS('Воркеры остановлены.'))
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в реплики из DATABASE_REPLICAS '
+            'или в указанные базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases', nargs='*', help='Алиасы реплик из DATABASES.')
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or settings.DATABASE_REPLICAS
+        source = connections[DEFAULT_DB_ALIAS]
+        for alias in aliases:
+            if alias not in settings.DATABASES or alias == DEFAULT_DB_ALIAS:
+                raise CommandError(f'Нет реплики {alias}.')
+            target = connections[alias]
+            if {source.vendor, target.vendor} != {'sqlite'}:
+                raise CommandError(
+                    'Копировать можно только SQLite в SQLite; реплики '
+                    'других СУБД обновляет их репликация.')
+            source.ensure_connection()
+            target.ensure_connection()
+            # Онлайн-копия: писать в основную базу можно и во время неё.
+            source.connection.backup(target.connection)
+            self.stdout.write(f'{alias}: скопирована.')
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены.'))
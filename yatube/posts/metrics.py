@@ -0,0 +1,407 @@
+"""Метрики запросов.
+
+``MetricsMiddleware`` меряет у каждого запроса общее время, время и
+число SQL-запросов, время рендеринга шаблонов, попадания и промахи
+кеша и вызовы sorl-thumbnail и складывает их в гистограммы и счётчики
+процесса по имени URL (``posts:index``, ``posts:profile``...). Время
+шаблонов включает и SQL, который выполняется при их рендеринге. Там
+же время и исход фоновых задач (``record_task``) и ответы на условные
+GET (``record_conditional``).
+
+``metrics_view`` отдаёт метрики в текстовом формате Prometheus. У
+каждого процесса они свои, Prometheus опрашивает процессы по
+отдельности. Запросы дольше ``METRICS_SLOW_REQUEST_SECONDS`` пишутся в
+журнал ``posts.metrics`` вместе с самым долгим SQL.
+
+При ``METRICS_ENABLED = False`` middleware исключает себя из цепочки, а
+шаблоны, кеш и миниатюры только проверяют, что запрос не измеряется.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import (DjangoTemplates, Template,
+                                             reraise)
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# Запросы к URL без имени (например, 404) собираются под этим именем.
+UNRESOLVED = '<unresolved>'
+# Сколько символов самого долгого SQL писать в журнал.
+SQL_LOG_LENGTH = 2000
+
+METRICS = {
+    'yatube_request_seconds': (
+        'histogram', 'Время обработки запроса.'),
+    'yatube_request_db_seconds': (
+        'histogram', 'Время SQL-запросов за запрос.'),
+    'yatube_request_queries': (
+        'histogram', 'Число SQL-запросов за запрос.'),
+    'yatube_request_template_seconds': (
+        'histogram', 'Время рендеринга шаблонов за запрос.'),
+    'yatube_requests_total': (
+        'counter', 'Запросы по коду ответа.'),
+    'yatube_cache_gets_total': (
+        'counter', 'Чтения кеша: попадания (hit) и промахи (miss).'),
+    'yatube_thumbnail_calls_total': (
+        'counter', 'Вызовы get_thumbnail sorl-thumbnail.'),
+    'yatube_thumbnail_seconds_total': (
+        'counter', 'Время в get_thumbnail sorl-thumbnail.'),
+    'yatube_task_seconds': (
+        'histogram', 'Время выполнения фоновой задачи.'),
+    'yatube_tasks_total': (
+        'counter', 'Фоновые задачи: выполнена (ok), будет повторена '
+                   '(retry), не выполнена (failed).'),
+    'yatube_conditional_requests_total': (
+        'counter', 'Условные GET: страница не изменилась, ответ 304 (hit), '
+                   'или отдана заново (miss).'),
+}
+
+_state = threading.local()
+_MISSING = object()
+
+
+class RequestStats:
+    """Что успел сделать текущий запрос."""
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.worst_sql = None
+        self.worst_sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.thumbnails = 0
+        self.thumbnail_seconds = 0.0
+
+
+def current():
+    """``RequestStats`` измеряемого запроса этого потока или None."""
+    return getattr(_state, 'stats', None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Последняя ячейка — значения больше последней границы.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+def _labels(pairs):
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for name, value in pairs)
+    return ','.join(f'{name}="{value}"' for name, value in escaped)
+
+
+class Registry:
+    """Гистограммы и счётчики процесса; ключ — имя метрики и метки."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, labels, value, buckets=SECONDS_BUCKETS):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[name, labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.counters[name, labels] = (
+                self.counters.get((name, labels), 0) + value)
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        with self.lock:
+            histograms = {
+                key: (histogram.buckets, list(histogram.counts),
+                      histogram.sum)
+                for key, histogram in self.histograms.items()}
+            counters = dict(self.counters)
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            if kind == 'counter':
+                for key in sorted(key for key in counters if key[0] == name):
+                    lines.append(
+                        f'{name}{{{_labels(key[1])}}} {counters[key]:g}')
+                continue
+            for key in sorted(key for key in histograms if key[0] == name):
+                buckets, counts, total = histograms[key]
+                total_count = 0
+                for bound, count in zip(buckets + ('+Inf',), counts):
+                    total_count += count
+                    le = bound if isinstance(bound, str) else f'{bound:g}'
+                    labels = _labels(key[1] + (('le', le),))
+                    lines.append(f'{name}_bucket{{{labels}}} {total_count}')
+                labels = _labels(key[1])
+                lines.append(f'{name}_sum{{{labels}}} {total:g}')
+                lines.append(f'{name}_count{{{labels}}} {total_count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = current()
+        if stats is not None:
+            seconds = time.perf_counter() - started
+            stats.queries += 1
+            stats.db_seconds += seconds
+            if seconds >= stats.worst_sql_seconds:
+                stats.worst_sql, stats.worst_sql_seconds = sql, seconds
+
+
+def _count_gets(cache):
+    """Считать попадания и промахи ``get`` и ``get_many`` кеша.
+
+    Объекты бэкендов кеша у каждого потока свои, поэтому подменяются
+    методы самого объекта при первом измеряемом запросе потока.
+    """
+    get, get_many = cache.get, cache.get_many
+
+    def counted_get(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        stats = current()
+        if stats is not None:
+            if value is _MISSING:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is _MISSING else value
+
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version=version)
+        stats = current()
+        if stats is not None:
+            stats.cache_hits += len(values)
+            stats.cache_misses += len(keys) - len(values)
+        return values
+
+    cache.get = counted_get
+    # Штатный get_many вызывает get, и ключи посчитаются там.
+    if type(cache).get_many is not BaseCache.get_many:
+        cache.get_many = counted_get_many
+    cache.metrics_counted = True
+
+
+@contextmanager
+def thumbnail_call():
+    """Учесть вызов sorl-thumbnail в метриках запроса."""
+    stats = current()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.thumbnails += 1
+        stats.thumbnail_seconds += time.perf_counter() - started
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = current()
+        if stats is None:
+            return super().render(context, request)
+        # Шаблон, отрендеренный из другого, уже входит в его время.
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, который меряет время рендеринга."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(
+                self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return getattr(match, 'view_name', None) or UNRESOLVED
+
+
+def _record(request, response, seconds, stats):
+    view = _view_name(request)
+    if view == 'metrics':
+        return
+    labels = (('view', view),)
+    registry.observe('yatube_request_seconds', labels, seconds)
+    registry.observe('yatube_request_db_seconds', labels, stats.db_seconds)
+    registry.observe('yatube_request_queries', labels, stats.queries,
+                     QUERIES_BUCKETS)
+    registry.observe('yatube_request_template_seconds', labels,
+                     stats.template_seconds)
+    registry.inc('yatube_requests_total',
+                 labels + (('status', response.status_code),))
+    registry.inc('yatube_cache_gets_total', labels + (('result', 'hit'),),
+                 stats.cache_hits)
+    registry.inc('yatube_cache_gets_total', labels + (('result', 'miss'),),
+                 stats.cache_misses)
+    if stats.thumbnails:
+        registry.inc('yatube_thumbnail_calls_total', labels,
+                     stats.thumbnails)
+        registry.inc('yatube_thumbnail_seconds_total', labels,
+                     stats.thumbnail_seconds)
+    if seconds >= settings.METRICS_SLOW_REQUEST_SECONDS:
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.3f с; SQL: %d за %.3f с; '
+            'шаблоны: %.3f с; кеш: %d попаданий, %d промахов; '
+            'миниатюры: %d за %.3f с. Самый долгий SQL (%.3f с): %s',
+            request.method, request.get_full_path(), view, seconds,
+            stats.queries, stats.db_seconds, stats.template_seconds,
+            stats.cache_hits, stats.cache_misses, stats.thumbnails,
+            stats.thumbnail_seconds, stats.worst_sql_seconds,
+            (stats.worst_sql or '-')[:SQL_LOG_LENGTH])
+
+
+def record_task(name, result, seconds):
+    """Учесть выполнение фоновой задачи ``posts.workers``."""
+    if not settings.METRICS_ENABLED:
+        return
+    labels = (('task', name),)
+    registry.observe('yatube_task_seconds', labels, seconds)
+    registry.inc('yatube_tasks_total', labels + (('result', result),))
+
+
+def record_conditional(request, response):
+    """Учесть ответ на условный GET (``posts.page_cache.conditional``)."""
+    if not settings.METRICS_ENABLED or not (
+            request.META.get('HTTP_IF_NONE_MATCH')
+            or request.META.get('HTTP_IF_MODIFIED_SINCE')):
+        return
+    result = 'hit' if response.status_code == 304 else 'miss'
+    registry.inc('yatube_conditional_requests_total',
+                 (('view', _view_name(request)), ('result', result)))
+
+
+@contextmanager
+def _measuring(stats):
+    """Учитывать SQL, кеш и шаблоны текущего потока в ``stats``."""
+    _state.stats = stats
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_time_query))
+            yield
+    finally:
+        _state.stats = None
+
+
+class _MeteredContent:
+    """Тело потокового ответа, которое читается уже после выхода из
+    middleware: запросы при чтении каждой порции идут в метрики запроса,
+    а сам запрос учитывается, когда тело дочитано или закрыто."""
+
+    def __init__(self, content, request, response, started, stats):
+        self.content = content
+        self.request = request
+        self.response = response
+        self.started = started
+        self.stats = stats
+        self.recorded = False
+
+    def __iter__(self):
+        while True:
+            with _measuring(self.stats):
+                try:
+                    chunk = next(self.content)
+                except StopIteration:
+                    break
+            yield chunk
+        self.close()
+
+    def close(self):
+        if not self.recorded:
+            self.recorded = True
+            _record(self.request, self.response,
+                    time.perf_counter() - self.started, self.stats)
+
+
+class MetricsMiddleware:
+    """Собирать метрики запросов.
+
+    Стоит первым в ``MIDDLEWARE``, чтобы мерить и остальные middleware.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for alias in settings.CACHES:
+            cache = caches[alias]
+            if not getattr(cache, 'metrics_counted', False):
+                _count_gets(cache)
+        stats = RequestStats()
+        started = time.perf_counter()
+        with _measuring(stats):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = _MeteredContent(
+                response.streaming_content, request, response, started,
+                stats)
+        else:
+            _record(request, response, time.perf_counter() - started, stats)
+        return response
+
+
+def metrics_view(request):
+    """Метрики процесса для Prometheus: персоналу и адресам из
+    ``METRICS_ALLOWED_IPS``."""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if not (request.user.is_staff or request.META.get('REMOTE_ADDR')
+            in settings.METRICS_ALLOWED_IPS):
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.6 on 2026-10-18 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_user_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserStats = apps.get_model('posts', 'UserStats')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    sources = {
+        'post_count': (Post, 'author_id'),
+        'comment_count': (Comment, 'author_id'),
+        'follower_count': (Follow, 'author_id'),
+        'following_count': (Follow, 'user_id'),
+    }
+    counts = {
+        field: dict(model.objects.values_list(column)
+                    .annotate(models.Count('pk')).order_by())
+        for field, (model, column) in sources.items()
+    }
+    UserStats.objects.bulk_create(
+        UserStats(user_id=user_id, **{
+            field: values.get(user_id, 0)
+            for field, values in counts.items()})
+        for user_id in User.objects.values_list('pk', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0006_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_count', models.IntegerField(default=0)),
+                ('comment_count', models.IntegerField(default=0)),
+                ('follower_count', models.IntegerField(default=0)),
+                ('following_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
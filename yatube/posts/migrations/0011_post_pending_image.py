@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='pending_image',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+from posts.stemmer import stem_text
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        # Основы слов считает posts.stemmer, поэтому токенизатор только
+        # режет по словам и не склеивает «й» с «и».
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE posts_post_fts USING fts5('
+            'text, tokenize="unicode61 remove_diacritics 0")')
+        Post = apps.get_model('posts', 'Post')
+        for pk, text in Post.objects.values_list('pk', 'text').iterator():
+            schema_editor.execute(
+                'INSERT INTO posts_post_fts (rowid, text) VALUES (%s, %s)',
+                [pk, stem_text(text)])
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX posts_post_text_search_idx ON posts_post '
+            "USING GIN (to_tsvector('russian', text))")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE posts_post_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX posts_post_text_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Оставить по одной подписке на пару (user, author) и пересчитать
+    счётчики подписок затронутых пользователей."""
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    duplicates = Follow.objects.values('user_id', 'author_id').annotate(
+        first=models.Min('pk'), count=models.Count('pk')
+    ).filter(count__gt=1).order_by()
+    user_ids = set()
+    for row in duplicates.iterator():
+        Follow.objects.filter(
+            user_id=row['user_id'], author_id=row['author_id']
+        ).exclude(pk=row['first']).delete()
+        user_ids.update((row['user_id'], row['author_id']))
+    for user_id in user_ids:
+        UserStats.objects.filter(user_id=user_id).update(
+            follower_count=Follow.objects.filter(author_id=user_id).count(),
+            following_count=Follow.objects.filter(user_id=user_id).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_task'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
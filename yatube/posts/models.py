@@ -1,5 +1,11 @@
+import json
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -13,6 +19,23 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор, группа и число комментариев одним
+        запросом."""
+        # Подзапрос по индексу (post, created) вместо JOIN + GROUP BY:
+        # так страница ленты читается по индексу сортировки без
+        # временных B-деревьев.
+        comments = Comment.objects.filter(
+            post=models.OuterRef('pk')
+        ).order_by().values('post').annotate(
+            count=models.Count('pk')).values('count')
+        return self.select_related('author', 'group').annotate(
+            comment_count=Coalesce(
+                models.Subquery(comments, output_field=models.IntegerField()),
+                0))
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField('date published', auto_now_add=True)
@@ -25,15 +48,38 @@ class Post(models.Model):
         blank=True, null=True,
         related_name='posts'
     )
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # Одинаковые картинки хранятся одним файлом (см. posts.storage).
+    image = models.ImageField(
+        upload_to='posts/', storage=ContentAddressedStorage(),
+        blank=True, null=True)
+    # JSON {имя миниатюры: URL}, заполняется фоновой задачей после
+    # загрузки картинки (см. posts.thumbnails).
+    thumbnails = models.TextField(blank=True, default='', editable=False)
+    # Имя загрузки, которая ещё обрабатывается (см. posts.images).
+    pending_image = models.CharField(
+        max_length=255, blank=True, default='', editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+        ]
 
     def __str__(self):
         result = self.text
         return result[:15]
 
+    @property
+    def thumbnail_urls(self):
+        return json.loads(self.thumbnails) if self.thumbnails else {}
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -47,6 +93,14 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField('date_published', auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+            models.Index(fields=['-created', '-id'],
+                         name='comment_created_idx'),
+        ]
+
     def __str__(self):
         result = self.text
         return result
@@ -62,3 +116,132 @@ class Follow(models.Model):
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'], name='unique_follow')]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx')]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry')]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx')]
+
+
+class UserStatsQuerySet(models.QuerySet):
+    def bump(self, user_id, **deltas):
+        """Атомарно сдвинуть счётчики пользователя на ``deltas``."""
+        self.filter(user_id=user_id).update(**{
+            field: models.F(field) + delta
+            for field, delta in deltas.items()})
+
+    def rebuild(self, user_ids=None):
+        """Пересчитать статистику по таблицам Post, Comment и Follow."""
+        users = User.objects.all()
+        if user_ids is not None:
+            users = users.filter(pk__in=user_ids)
+        user_ids = list(users.values_list('pk', flat=True))
+        sources = {
+            'post_count': (Post, 'author_id'),
+            'comment_count': (Comment, 'author_id'),
+            'follower_count': (Follow, 'author_id'),
+            'following_count': (Follow, 'user_id'),
+        }
+        counts = {
+            field: dict(
+                model.objects.filter(**{f'{column}__in': user_ids})
+                .values_list(column).annotate(models.Count('pk')).order_by())
+            for field, (model, column) in sources.items()
+        }
+        stats = [
+            UserStats(user_id=user_id, **{
+                field: values.get(user_id, 0)
+                for field, values in counts.items()})
+            for user_id in user_ids
+        ]
+        with transaction.atomic():
+            self.filter(user_id__in=user_ids).delete()
+            self.bulk_create(stats)
+        return stats
+
+    def for_user(self, user):
+        try:
+            return user.stats
+        except UserStats.DoesNotExist:
+            pass
+        try:
+            return self.rebuild([user.pk])[0]
+        except IntegrityError:
+            # Строку уже пересоздал параллельный запрос.
+            return self.get(user=user)
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        primary_key=True, related_name='stats')
+    post_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+    follower_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+
+    objects = UserStatsQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.user}: {self.post_count}'
+
+
+class TaskQuerySet(models.QuerySet):
+    def due(self, now):
+        """Задачи, которые пора выполнять: дождавшиеся своего времени и
+        брошенные упавшим воркером."""
+        return self.filter(
+            models.Q(status=Task.QUEUED, run_at__lte=now)
+            | models.Q(status=Task.RUNNING, locked_until__lt=now))
+
+
+class Task(models.Model):
+    """Фоновая задача очереди ``posts.workers.DatabaseBackend``."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'в очереди'),
+        (RUNNING, 'выполняется'),
+        (FAILED, 'не выполнена'),
+    )
+
+    name = models.CharField(max_length=200)
+    args = models.TextField(default='[]')
+    # Ключ дедупликации: в очереди не больше одной задачи с ключом.
+    key = models.CharField(max_length=40)
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status='queued'),
+                name='unique_queued_task')]
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='task_status_run_at_idx')]
+
+    def __str__(self):
+        return f'{self.name}{self.args}'
@@ -0,0 +1,176 @@
+"""Кеш страниц для анонимных посетителей.
+
+Ключ страницы складывается из пути с query string, признака анонимности
+и версий тегов, от которых страница зависит (``feed``, ``group:<slug>``,
+``author:<username>``, ``post:<id>``). Сигналы моделей поднимают версии
+затронутых тегов, и старые записи просто перестают читаться.
+
+Версия тега — время его последнего изменения в наносекундах, поэтому
+из тех же версий ``conditional`` строит и ``ETag``, и ``Last-Modified``
+и отвечает 304 на условные GET без SQL-запросов и без вызова view.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import metrics, replicas
+from .models import Group
+
+HITS_KEY = 'posts:page_cache:hits'
+MISSES_KEY = 'posts:page_cache:misses'
+CARD_CACHE_TIMEOUT = 60 * 60
+
+
+def _version_key(tag):
+    return f'posts:version:{tag}'
+
+
+def _new_version():
+    # Время, а не счётчик: после сброса кеша версия не совпадёт со
+    # старой, а по версиям видно время изменения страницы.
+    return time.time_ns()
+
+
+def get_versions(tags):
+    keys = [_version_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+    if len(versions) < len(keys):
+        versions = cache.get_many(keys)
+    return [versions.get(key, 0) for key in keys]
+
+
+def _set_versions(tags):
+    cache.set_many({_version_key(tag): _new_version() for tag in tags}, None)
+
+
+def bump(*tags):
+    """Сделать устаревшими все страницы, зависящие от ``tags``.
+
+    Версии меняются сразу и ещё раз после коммита: до коммита
+    параллельный запрос мог прочитать старые строки и закешировать их
+    под новой версией.
+    """
+    _set_versions(tags)
+    transaction.on_commit(lambda: _set_versions(tags))
+
+
+def bump_post(post, group_ids=()):
+    """Сделать устаревшими страницы и карточку поста ``post``."""
+    tags = ['feed', f'post:{post.pk}', f'author:{post.author.username}']
+    group_ids = {post.group_id, *group_ids} - {None}
+    if group_ids:
+        slugs = Group.objects.filter(
+            pk__in=group_ids).values_list('slug', flat=True)
+        tags += [f'group:{slug}' for slug in slugs]
+    bump(*tags)
+
+
+def with_card_versions(posts):
+    """Проставить постам ``card_version`` для кеша их карточек.
+
+    Версия карточки меняется при правке поста, новом комментарии и
+    изменении групп — вместе с версиями тегов ``post:<id>`` и
+    ``groups``. Все версии читаются одним запросом к кешу.
+    ``card_cache_timeout`` 0 — карточку только читать из кеша.
+    """
+    posts = list(posts)
+    timeout = 0 if replicas.reading_from_replica() else CARD_CACHE_TIMEOUT
+    versions = get_versions(
+        [f'post:{post.pk}' for post in posts] + ['groups'])
+    groups_version = versions.pop()
+    for post, version in zip(posts, versions):
+        post.card_version = f'{version}.{groups_version}'
+        post.card_cache_timeout = timeout
+    return posts
+
+
+def _count(key):
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def stats():
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': values.get(HITS_KEY, 0),
+            'misses': values.get(MISSES_KEY, 0)}
+
+
+def page_key(request, tags):
+    versions = '.'.join(str(version) for version in get_versions(tags))
+    anonymous = int(not request.user.is_authenticated)
+    raw = f'{request.get_full_path()}|{anonymous}|{versions}'
+    return 'posts:page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cache_for_anonymous(get_tags):
+    """Кешировать ответ view для анонимных GET-запросов.
+
+    ``get_tags`` получает аргументы view из URL и возвращает теги, от
+    которых зависит страница.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method != 'GET' or request.user.is_authenticated
+                    or not settings.PAGE_CACHE_TIMEOUT):
+                return view(request, *args, **kwargs)
+            key = page_key(request, get_tags(*args, **kwargs))
+            response = cache.get(key)
+            if response is not None:
+                _count(HITS_KEY)
+                response['X-Page-Cache'] = 'HIT'
+                return response
+            _count(MISSES_KEY)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+            response['X-Page-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional(get_tags, per_user=False):
+    """Отвечать 304, если страница не изменилась.
+
+    ``get_tags`` получает запрос и аргументы view из URL и возвращает
+    теги, от которых зависит страница. ``per_user`` — страница у каждого
+    пользователя своя, у анонимных посетителей общая. В формах страницы
+    вошедшего пользователя есть CSRF-токен, а вход меняет его, поэтому
+    токен тоже входит в ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            versions = get_versions(get_tags(request, *args, **kwargs))
+            parts = [request.get_full_path(), *map(str, versions)]
+            if per_user and request.user.is_authenticated:
+                parts += [str(request.user.pk),
+                          request.META.get('CSRF_COOKIE', '')]
+            etag = quote_etag(
+                hashlib.md5('|'.join(parts).encode()).hexdigest())
+            last_modified = max(versions, default=0) // 10 ** 9 or None
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            metrics.record_conditional(request, response)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if last_modified:
+                    response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,255 @@
+import base64
+import json
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+from . import thumbnails
+from .counters import post_count
+from .page_cache import with_card_versions
+
+
+def encode_cursor(values):
+    """Непрозрачный токен курсора из JSON-совместимых ``values``."""
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Значения курсора или None, если токен испорчен."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+class CountingPaginator(Paginator):
+    """Paginator, который берёт число постов из счётчика области
+    ``scope`` (или готовое ``count``) вместо ``COUNT(*)`` на каждый
+    запрос."""
+
+    def __init__(self, object_list, per_page, scope, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scope = scope
+        if count is not None:
+            self.count = count
+
+    @cached_property
+    def count(self):
+        return post_count(self.scope)
+
+
+def _sqlite_stat(cursor, table):
+    # sqlite_stat1 появляется после ANALYZE (или PRAGMA optimize); первое
+    # число в stat — число строк таблицы на момент сбора статистики.
+    try:
+        cursor.execute(
+            'SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+    except DatabaseError:
+        return None
+    row = cursor.fetchone()
+    return int(row[0].split()[0]) if row else None
+
+
+def estimate_count(model, using='default'):
+    """Примерное число строк таблицы ``model`` без ``COUNT(*)``.
+
+    PostgreSQL хранит оценку в ``pg_class.reltuples``, SQLite — в
+    ``sqlite_stat1`` после ANALYZE. Без статистики берётся наибольший
+    id — верхняя граница, читаемая по первичному ключу. None, если
+    оценки нет.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [table])
+            row = cursor.fetchone()
+        return row[0] if row and row[0] > 0 else None
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            count = _sqlite_stat(cursor, table)
+        if count:
+            return count
+    return model._default_manager.using(using).aggregate(
+        count=Max('pk'))['count']
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки: у таблиц больше
+    ``ADMIN_EXACT_COUNT_LIMIT`` строк число строк без фильтров берётся
+    из оценки ``estimate_count``; с фильтрами считается точно.
+
+    ``estimated`` отмечает, что ``count`` приблизительный.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate and estimate > settings.ADMIN_EXACT_COUNT_LIMIT:
+                self.estimated = True
+                return estimate
+        return super().count
+
+
+class CursorPage(Sequence):
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу сортировки вместо OFFSET.
+
+    Курсор — непрозрачный токен со значениями полей ``ordering`` у
+    крайнего объекта страницы, поэтому глубокие страницы читаются так же
+    быстро, как первая, и без ``COUNT(*)``.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    @cached_property
+    def count(self):
+        return self.object_list.count()
+
+    def _fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = []
+        for name in self._fields():
+            value = getattr(obj, name)
+            # isoformat() без усечения микросекунд, иначе курсор
+            # перескочит через посты с почти одинаковой датой.
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value)
+        return encode_cursor(values)
+
+    def decode_cursor(self, cursor):
+        """Вернуть значения полей курсора или None, если он испорчен."""
+        values = decode_cursor(cursor)
+        fields = self._fields()
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        opts = self.object_list.model._meta
+        try:
+            return [opts.get_field(name).to_python(value)
+                    for name, value in zip(fields, values)]
+        except ValidationError:
+            return None
+
+    def _seek(self, values, reverse):
+        condition = Q()
+        for position, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            field = name.lstrip('-')
+            step = Q(**{f'{field}__{lookup}': values[position]})
+            for previous, value in zip(self._fields(), values[:position]):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.ordering]
+
+    def iterate(self, after=None):
+        """Итератор по объектам после курсора ``after`` — до
+        ``per_page + 1`` штук, чтобы понять, есть ли следующая страница;
+        большие страницы не загружаются в память целиком."""
+        after_values = self.decode_cursor(after) if after else None
+        queryset = self.object_list.order_by(*self.ordering)
+        if after_values is not None:
+            queryset = queryset.filter(self._seek(after_values, False))
+        return queryset[:self.per_page + 1].iterator()
+
+    def get_page(self, after=None, before=None):
+        after_values = self.decode_cursor(after) if after else None
+        before_values = self.decode_cursor(before) if before else None
+        if before_values is not None:
+            queryset = self.object_list.filter(
+                self._seek(before_values, reverse=True)
+            ).order_by(*self._reversed_ordering())
+            objects = list(queryset[:self.per_page + 1])
+            has_more = len(objects) > self.per_page
+            objects = objects[:self.per_page][::-1]
+            has_previous, has_next = has_more, True
+        else:
+            queryset = self.object_list.order_by(*self.ordering)
+            if after_values is not None:
+                queryset = queryset.filter(self._seek(after_values, False))
+            objects = list(queryset[:self.per_page + 1])
+            has_next = len(objects) > self.per_page
+            objects = objects[:self.per_page]
+            has_previous = after_values is not None
+        next_cursor = previous_cursor = None
+        if objects and has_next:
+            next_cursor = self.encode_cursor(objects[-1])
+        if objects and has_previous:
+            previous_cursor = self.encode_cursor(objects[0])
+        return CursorPage(objects, self, next_cursor, previous_cursor)
+
+
+def paginate(request, object_list, feed, scope, count=None):
+    """Страница ленты ``feed`` в режиме из ``CURSOR_PAGINATED_FEEDS``;
+    ``scope`` — область счётчика постов для постраничного режима.
+
+    Постам страницы проставляется ``card_version`` для кеша карточек и
+    готовые миниатюры (см. ``thumbnails.resolve``).
+    """
+    if feed in settings.CURSOR_PAGINATED_FEEDS:
+        paginator = CursorPaginator(object_list, settings.PAGES)
+        page = paginator.get_page(
+            request.GET.get('after'), request.GET.get('before'))
+    else:
+        paginator = CountingPaginator(
+            object_list, settings.PAGES, scope, count)
+        page = paginator.get_page(request.GET.get('page'))
+    page.object_list = thumbnails.resolve(
+        with_card_versions(page.object_list))
+    return page
+
+
+def paginate_comments(request, post):
+    """Страница комментариев поста с авторами, от старых к новым; следующая
+    — по курсору ``?after=``."""
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE, ordering=('created', 'id'))
+    return paginator.get_page(request.GET.get('after'))
@@ -0,0 +1,95 @@
+"""Чтение лент с реплик базы.
+
+Views, обёрнутые в ``replica_reads``, читают с одной из реплик из
+``DATABASE_REPLICAS``; все записи и остальные чтения идут в основную
+базу ``default`` (``ReplicaRouter``). Реплики отстают от основной
+базы, поэтому ``PinPrimaryMiddleware`` после запроса, который что-то
+записал, ставит пользователю cookie, и ещё ``REPLICA_PIN_SECONDS``
+секунд он читает только с основной базы и видит свои посты,
+комментарии и подписки сразу после редиректа.
+
+Кеши, ключи которых — версии тегов (``posts.page_cache``), не
+заполняются данными с реплик: версия поднимается при записи, и
+отставшая копия осталась бы в кеше под новой версией. Поэтому
+анонимные страницы (их промахи кеша редки) читаются с основной базы, а
+карточки постов со страниц с реплики только читаются из кеша.
+
+Реплики SQLite-файлов обновляет команда ``manage.py sync_replicas``;
+реплики PostgreSQL и других СУБД — штатная репликация.
+"""
+import random
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'use_primary'
+
+_state = threading.local()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'replica', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def reading_from_replica():
+    return getattr(_state, 'replica', None) is not None
+
+
+def _use_replica(request):
+    if (not settings.DATABASE_REPLICAS
+            or request.method not in ('GET', 'HEAD')
+            or PIN_COOKIE in request.COOKIES):
+        return False
+    return not (settings.PAGE_CACHE_TIMEOUT
+                and not request.user.is_authenticated)
+
+
+def replica_reads(view):
+    """Читать запросы view с реплики, если пользователь недавно ничего
+    не записывал."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _use_replica(request):
+            return view(request, *args, **kwargs)
+        # Одна реплика на весь запрос, чтобы страница была согласованной.
+        _state.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = None
+    return wrapper
+
+
+class PinPrimaryMiddleware:
+    """Закрепить пользователя за основной базой после записи.
+
+    Стоит первым в ``MIDDLEWARE``, чтобы заметить и запись сессии.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        response = self.get_response(request)
+        if _state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,212 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд задаёт настройка ``SEARCH_BACKEND``:
+
+* ``SQLiteBackend`` хранит основы слов постов (``posts.stemmer``) в
+  FTS5-таблице ``posts_post_fts`` с ``rowid`` = id поста; сигналы Post
+  обновляют её при каждом сохранении и удалении;
+* ``PostgresBackend`` ищет по ``tsvector`` с конфигурацией ``russian``,
+  индекс — GIN по выражению, его поддерживает сама база.
+
+Результаты отсортированы по релевантности (больше — лучше), при равной
+— по id, новые первыми; страницы листаются курсором по этой паре.
+Между страницами ранги могут немного сдвинуться, если индекс изменился.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Func, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .paginators import CursorPage, decode_cursor, encode_cursor
+from .stemmer import WORD, stem, stem_text
+
+# Больше слов в запросе не нужно, а длинный запрос дорого разбирать.
+MAX_TERMS = 10
+
+
+class SQLiteBackend:
+    table = 'posts_post_fts'
+
+    def _terms(self, query):
+        return [stem(word) for word in WORD.findall(query)][:MAX_TERMS]
+
+    def _match(self, terms):
+        # Каждое слово в кавычках: синтаксис FTS5 в запросе не работает.
+        return ' '.join(f'"{term}"' for term in terms)
+
+    def index(self, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post_id])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                [post_id, stem_text(text)])
+
+    def index_many(self, posts):
+        """Проиндексировать пары ``(id, текст)`` разом."""
+        posts = [(post_id, stem_text(text)) for post_id, text in posts]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(post_id,) for post_id, _ in posts])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                posts)
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            posts = Post.objects.values_list('pk', 'text').iterator()
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                ((pk, stem_text(text)) for pk, text in posts))
+
+    def filter(self, queryset, query):
+        terms = self._terms(query)
+        if not terms:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [self._match(terms)]))
+
+    def search(self, query, group_id=None, author_id=None, after=None,
+               limit=10):
+        """Список ``(id, ранг)``; ``after`` — пара ``(ранг, id)``
+        последнего результата предыдущей страницы."""
+        terms = self._terms(query)
+        if not terms:
+            return []
+        table = self.table
+        score = f'-bm25({table})'
+        sql = [f'SELECT {table}.rowid, {score} AS score FROM {table} '
+               f'JOIN posts_post ON posts_post.id = {table}.rowid '
+               f'WHERE {table} MATCH %s']
+        params = [self._match(terms)]
+        if group_id is not None:
+            sql.append('AND posts_post.group_id = %s')
+            params.append(group_id)
+        if author_id is not None:
+            sql.append('AND posts_post.author_id = %s')
+            params.append(author_id)
+        if after is not None:
+            sql.append(f'AND ({score} < %s OR '
+                       f'({score} = %s AND {table}.rowid < %s))')
+            params += [after[0], after[0], after[1]]
+        sql.append(f'ORDER BY score DESC, {table}.rowid DESC LIMIT %s')
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(' '.join(sql), params)
+            return cursor.fetchall()
+
+
+class PostgresBackend:
+    """Поиск средствами PostgreSQL.
+
+    Стемминг делает сама база (конфигурация ``russian``), а индекс —
+    GIN по ``to_tsvector('russian', text)`` из миграции, поэтому
+    ``index``, ``remove`` и ``rebuild`` ничего не делают. Запросы
+    строятся по тому же выражению, иначе планировщик не возьмёт индекс.
+    """
+    config = 'russian'
+
+    def index(self, post_id, text):
+        pass
+
+    def index_many(self, posts):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def _vector(self):
+        from django.contrib.postgres.search import SearchVectorField
+
+        # Ровно выражение индекса из миграции 0013: SearchVector дал бы
+        # to_tsvector(%s::regconfig, COALESCE(text, '')), и индекс бы не
+        # использовался.
+        return Func(
+            F('text'), function='to_tsvector',
+            template=f"%(function)s('{self.config}', %(expressions)s)",
+            output_field=SearchVectorField())
+
+    def _annotate(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        vector = self._vector()
+        search_query = SearchQuery(query, config=self.config)
+        return queryset.annotate(
+            search=vector, score=SearchRank(vector, search_query)
+        ).filter(search=search_query)
+
+    def filter(self, queryset, query):
+        return self._annotate(queryset, query)
+
+    def search(self, query, group_id=None, author_id=None, after=None,
+               limit=10):
+        posts = self._annotate(Post.objects.all(), query)
+        if group_id is not None:
+            posts = posts.filter(group_id=group_id)
+        if author_id is not None:
+            posts = posts.filter(author_id=author_id)
+        if after is not None:
+            posts = posts.filter(
+                Q(score__lt=after[0]) | Q(score=after[0], pk__lt=after[1]))
+        return list(posts.order_by('-score', '-pk')
+                    .values_list('pk', 'score')[:limit])
+
+
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+def update_index(post_id):
+    """Привести запись поста в индексе к его текущему тексту."""
+    text = Post.objects.filter(pk=post_id).values_list(
+        'text', flat=True).first()
+    if text is None:
+        get_backend().remove(post_id)
+    else:
+        get_backend().index(post_id, text)
+
+
+def filter_posts(queryset, query):
+    """Посты ``queryset``, подходящие под ``query``, в любом порядке."""
+    return get_backend().filter(queryset, query)
+
+
+def search(query, group=None, author=None, after=None, per_page=None):
+    """Страница результатов поиска: ``CursorPage`` с постами для ленты.
+
+    ``after`` — курсор ``next_cursor`` предыдущей страницы.
+    """
+    per_page = per_page or settings.PAGES
+    after_values = decode_cursor(after) if after else None
+    if not (isinstance(after_values, list) and len(after_values) == 2
+            and all(isinstance(value, (int, float))
+                    for value in after_values)):
+        after_values = None
+    hits = get_backend().search(
+        query,
+        group_id=group.pk if group else None,
+        author_id=author.pk if author else None,
+        after=after_values,
+        limit=per_page + 1)
+    has_next = len(hits) > per_page
+    hits = hits[:per_page]
+    posts = Post.objects.for_feed().in_bulk([pk for pk, _ in hits])
+    object_list = [posts[pk] for pk, _ in hits if pk in posts]
+    next_cursor = None
+    if has_next:
+        pk, score = hits[-1]
+        next_cursor = encode_cursor([score, pk])
+    return CursorPage(object_list, None, next_cursor, None)
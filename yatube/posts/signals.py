@@ -0,0 +1,176 @@
+import threading
+
+from django.db.models import Count
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import (counters, images, page_cache, search, thumbnails, timeline,
+               workers)
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+_cascade = threading.local()
+
+
+def _deleting_posts():
+    """id постов, которые сейчас удаляются в этом потоке."""
+    if not hasattr(_cascade, 'post_ids'):
+        _cascade.post_ids = set()
+    return _cascade.post_ids
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_values(sender, instance, raw, **kwargs):
+    instance._old_group_id = None
+    old_image = None
+    if not instance._state.adding:
+        old_values = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', 'image').first()
+        if old_values is not None:
+            instance._old_group_id, old_image = old_values
+    instance._image_staged = not raw and images.stage(instance, old_image)
+    instance._image_changed = (old_image or '') != (instance.image.name or '')
+    if instance._image_changed:
+        # Старые миниатюры не подходят к новой картинке.
+        instance.thumbnails = ''
+        instance._old_image = old_image
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def update_search_index(sender, instance, **kwargs):
+    workers.submit(search.update_index, instance.pk, dedupe=True)
+
+
+@receiver(post_save, sender=Post)
+def ingest_image(sender, instance, **kwargs):
+    if instance._image_staged:
+        workers.submit(images.ingest, instance.pk, instance.pending_image)
+
+
+@receiver(post_save, sender=Post)
+def generate_thumbnails(sender, instance, raw, **kwargs):
+    if instance._image_changed and not raw:
+        workers.submit(thumbnails.generate, instance.pk, dedupe=True)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, **kwargs):
+    if instance._image_changed:
+        images.schedule_release(instance._old_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    images.schedule_release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.update_counts(counters.post_scopes(instance), 1)
+        UserStats.objects.bump(instance.author_id, post_count=1)
+        if timeline.is_enabled():
+            workers.submit(timeline.fan_out, instance.pk)
+    elif instance._old_group_id != instance.group_id:
+        if instance._old_group_id is not None:
+            counters.update_counts([f'group:{instance._old_group_id}'], -1)
+        if instance.group_id is not None:
+            counters.update_counts([f'group:{instance.group_id}'], 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.update_counts(counters.post_scopes(instance), -1)
+    UserStats.objects.bump(instance.author_id, post_count=-1)
+
+
+@receiver(pre_delete, sender=Post)
+def delete_post_comments(sender, instance, **kwargs):
+    # Комментарии поста удаляются каскадом. Счётчики и страницы их
+    # авторов обновляются здесь одним запросом, а не сигналом на каждый
+    # комментарий; страницы самого поста обновит invalidate_post_pages.
+    commenters = Comment.objects.filter(post=instance).values(
+        'author_id', 'author__username').annotate(
+        count=Count('pk')).order_by()
+    tags = []
+    for row in commenters:
+        UserStats.objects.bump(row['author_id'], comment_count=-row['count'])
+        tags.append(f'author:{row["author__username"]}')
+    if tags:
+        page_cache.bump(*tags)
+    _deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def finish_post_delete(sender, instance, **kwargs):
+    _deleting_posts().discard(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.bump(instance.author_id, comment_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id in _deleting_posts():
+        return
+    UserStats.objects.bump(instance.author_id, comment_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.bump(instance.user_id, following_count=1)
+        UserStats.objects.bump(instance.author_id, follower_count=1)
+        if timeline.is_enabled():
+            workers.submit(
+                timeline.backfill, instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    UserStats.objects.bump(instance.user_id, following_count=-1)
+    UserStats.objects.bump(instance.author_id, follower_count=-1)
+    if timeline.is_enabled():
+        workers.submit(
+            timeline.remove_author, instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    page_cache.bump_post(
+        instance, [getattr(instance, '_old_group_id', None)])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    if instance.post_id in _deleting_posts():
+        return
+    page_cache.bump_post(instance.post)
+    # Счётчик комментариев автора комментария есть в его профиле.
+    page_cache.bump(f'author:{instance.author.username}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    # Название группы есть на карточках всех лент.
+    page_cache.bump('groups', f'group:{instance.slug}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    page_cache.bump(f'author:{instance.user.username}',
+                    f'author:{instance.author.username}')
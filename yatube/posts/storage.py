@@ -0,0 +1,44 @@
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME_RE = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла — sha256 его содержимого.
+
+    ``posts/photo.jpg`` сохраняется как ``posts/3f/a2/3fa2…c1.jpg``, и
+    одинаковые загрузки получают один файл, а по нему и один набор
+    миниатюр sorl-thumbnail. На файл могут ссылаться несколько постов,
+    поэтому удаляет его ``posts.images.release``, а не сама модель.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = posixpath.dirname(name)
+        if self.is_content_name(name):
+            directory = posixpath.dirname(posixpath.dirname(directory))
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension)
+
+    def is_content_name(self, name):
+        return bool(CONTENT_NAME_RE.search(name))
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        # При гонке двух одинаковых загрузок вторая получит суффикс от
+        # get_available_name(): лишний файл, но не потерянный.
+        return super()._save(name, content)
@@ -0,0 +1,18 @@
+from django import template
+
+
+register = template.Library()
+
+
+@register.filter
+def page_window(page, on_each_side=2):
+    """Номера страниц вокруг текущей, первая и последняя; None — пропуск."""
+    num_pages = page.paginator.num_pages
+    first = max(1, page.number - on_each_side)
+    last = min(num_pages, page.number + on_each_side)
+    window = list(range(first, last + 1))
+    if first > 1:
+        window[:0] = [1] if first == 2 else [1, None]
+    if last < num_pages:
+        window += [num_pages] if last == num_pages - 1 else [None, num_pages]
+    return window
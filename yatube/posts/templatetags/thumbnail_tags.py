@@ -0,0 +1,11 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.filter
+def picture_sources(post, name):
+    """Варианты миниатюры ``name`` для ``<source>`` в ``<picture>``."""
+    return thumbnails.picture_sources(post, name)
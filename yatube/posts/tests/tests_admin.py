@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..paginators import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class AdminChangeListTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.group = Group.objects.create(
+            title='Red Hot Chilly Peppers', slug='RHCP',
+            description='Тестовый текст для описания группы')
+        for number in range(5):
+            author = User.objects.create_user(username=f'author{number}')
+            post = Post.objects.create(
+                text=f'тестовый текст {number}', author=author,
+                group=cls.group)
+            Comment.objects.create(post=post, author=author, text='текст')
+            Follow.objects.create(user=cls.admin, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def count_queries(self, name, data=None):
+        url = reverse(f'admin:posts_{name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_related_objects_are_joined(self):
+        names = ('post', 'comment', 'follow')
+        few = {name: self.count_queries(name)[0] for name in names}
+        for number in range(5, 10):
+            author = User.objects.create_user(username=f'author{number}')
+            post = Post.objects.create(text='текст', author=author)
+            Comment.objects.create(post=post, author=author, text='текст')
+            Follow.objects.create(user=self.admin, author=author)
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(self.count_queries(name)[0], few[name])
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=2)
+    def test_large_tables_are_estimated(self):
+        Post.objects.filter(text='тестовый текст 0').delete()
+        _, response = self.count_queries('post')
+        # Без статистики оценка — наибольший id, удалённые строки в неё
+        # попадают.
+        self.assertEqual(response.context['cl'].result_count, 5)
+        self.assertContains(response, '≈&nbsp;</span>5 ')
+        _, response = self.count_queries(
+            'post', {'pub_date__gte': '2000-01-01'})
+        self.assertEqual(response.context['cl'].result_count, 4)
+        self.assertNotContains(response, '≈')
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=2)
+    def test_estimate_uses_sqlite_statistics(self):
+        Post.objects.filter(text='тестовый текст 0').delete()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE posts_post')
+        _, response = self.count_queries('post')
+        self.assertEqual(response.context['cl'].result_count, 4)
+        self.assertContains(response, '≈&nbsp;</span>4 ')
+
+    def test_small_tables_are_counted(self):
+        Post.objects.filter(text='тестовый текст 0').delete()
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.count, 4)
+
+    def test_follow_search_by_username_prefix(self):
+        _, response = self.count_queries('follow', {'q': 'author3'})
+        follows = list(response.context['cl'].result_list)
+        self.assertEqual([follow.author.username for follow in follows],
+                         ['author3'])
+        _, response = self.count_queries('follow', {'q': 'adm'})
+        self.assertEqual(response.context['cl'].result_count, 5)
+        _, response = self.count_queries('follow', {'q': 'AUTHOR3'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_autocomplete_fields(self):
+        url = reverse('admin:posts_post_add')
+        response = self.client.get(url)
+        self.assertContains(response, 'admin-autocomplete')
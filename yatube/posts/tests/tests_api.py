@@ -0,0 +1,153 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import api
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def read(response):
+    return json.loads(b''.join(response.streaming_content))
+
+
+@override_settings(API_MAX_LIMIT=4)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {number}', author=cls.author,
+                                group=cls.group if number % 2 else None)
+            for number in range(7)]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def walk(self, url, limit):
+        ids, after = [], None
+        while True:
+            params = {'limit': limit}
+            if after:
+                params['after'] = after
+            data = read(self.guest_client.get(url, params))
+            self.assertLessEqual(len(data['results']), limit)
+            ids += [item['id'] for item in data['results']]
+            after = data['next']
+            if not after:
+                return ids
+
+    def test_posts_are_streamed_page_by_page(self):
+        response = self.guest_client.get(reverse('api:posts'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        expected = [post.pk for post in reversed(self.posts)]
+        self.assertEqual(self.walk(reverse('api:posts'), 3), expected)
+        # Больше API_MAX_LIMIT за раз не отдаётся.
+        self.assertEqual(self.walk(reverse('api:posts'), 100), expected)
+
+    def test_stream_joins_chunks(self):
+        with self.settings(API_MAX_LIMIT=100):
+            old_chunk, api.STREAM_CHUNK = api.STREAM_CHUNK, 2
+            try:
+                data = read(self.guest_client.get(
+                    reverse('api:posts'), {'limit': 5}))
+            finally:
+                api.STREAM_CHUNK = old_chunk
+        self.assertEqual(len(data['results']), 5)
+        self.assertIsNotNone(data['next'])
+
+    def test_post_fields(self):
+        data = self.guest_client.get(
+            reverse('api:post', args=[self.posts[1].pk])).json()
+        self.assertEqual(data['text'], 'Пост 1')
+        self.assertEqual(data['author'], 'Tolstoy')
+        self.assertEqual(data['group'], 'group')
+        self.assertEqual(data['comment_count'], 0)
+        self.assertIsNone(data['image'])
+
+    def test_lists(self):
+        group_posts = read(self.guest_client.get(
+            reverse('api:group_posts', args=['group'])))['results']
+        self.assertEqual([item['id'] for item in group_posts],
+                         [self.posts[5].pk, self.posts[3].pk,
+                          self.posts[1].pk])
+        comments = read(self.guest_client.get(
+            reverse('api:comments', args=[self.posts[0].pk])))['results']
+        self.assertEqual([(item['author'], item['text']) for item in comments],
+                         [('reader', 'Комментарий')])
+        groups = read(self.guest_client.get(reverse('api:groups')))
+        self.assertEqual(groups['results'], [
+            {'slug': 'group', 'title': 'Группа', 'description': 'Описание'}])
+        user = self.guest_client.get(
+            reverse('api:user', args=['Tolstoy'])).json()
+        self.assertEqual(user['post_count'], 7)
+
+    def test_missing_objects(self):
+        for url in (reverse('api:post', args=[0]),
+                    reverse('api:comments', args=[0]),
+                    reverse('api:group_posts', args=['missing']),
+                    reverse('api:user', args=['missing']),
+                    reverse('api:user_posts', args=['missing'])):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertFalse(response.has_header('ETag'))
+
+    def test_not_modified(self):
+        url = reverse('api:posts')
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_edit_changes_etag(self):
+        url = reverse('api:posts')
+        etag = self.guest_client.get(url)['ETag']
+        post = self.posts[0]
+        post.text = 'Исправленный пост'
+        post.save()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_comment_changes_commenter_etag(self):
+        url = reverse('api:user', args=['reader'])
+        etag = self.guest_client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.posts[1], author=self.reader, text='Ещё комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comment_count'], 2)
+
+    def test_follow(self):
+        url = reverse('api:follow')
+        self.assertEqual(self.guest_client.get(url).status_code, 403)
+        response = self.authorized_client.get(url)
+        self.assertEqual(read(response)['results'], [])
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.authorized_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(read(response)['results']), 4)
+
+    def test_only_safe_methods(self):
+        response = self.authorized_client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,94 @@
+import asyncio
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from ..asgi import AsgiHandler, build_environ
+from ..models import Post
+
+User = get_user_model()
+
+
+def call(application, method, path, body=b'', headers=()):
+    """Выполнить запрос к ASGI-приложению; статус, заголовки и тело."""
+    scope = {
+        'type': 'http', 'method': method, 'path': path,
+        'query_string': b'', 'headers': list(headers),
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 5000),
+    }
+    messages = [{'type': 'http.request', 'body': body}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    start = sent[0]
+    return (start['status'], start['headers'],
+            b''.join(message.get('body', b'') for message in sent[1:]))
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=['testserver'])
+class AsgiHandlerTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='Tolstoy', password='war-and-peace')
+        Post.objects.create(text='Пост из пула потоков', author=self.author)
+        self.application = AsgiHandler()
+
+    def tearDown(self):
+        self.application.read_pool.shutdown()
+        self.application.pool.shutdown()
+
+    def test_read_views_render_in_read_pool(self):
+        url = reverse('posts:profile', args=['Tolstoy'])
+        status, headers, body = call(self.application, 'GET', url)
+        self.assertEqual(status, 200)
+        self.assertIn('Пост из пула потоков', body.decode())
+        self.assertTrue(
+            dict(headers)[b'content-type'].startswith(b'text/html'))
+        scope = {'method': 'GET', 'path': reverse('posts:index')}
+        self.assertIs(self.application.pool_for(scope),
+                      self.application.read_pool)
+
+    def test_writes_go_to_general_pool(self):
+        login = reverse('login')
+        scope = {'method': 'POST', 'path': login}
+        self.assertIs(self.application.pool_for(scope), self.application.pool)
+        _, headers, body = call(self.application, 'GET', login)
+        cookie = next(value.split(b';')[0] for name, value in headers
+                      if name == b'set-cookie')
+        token = re.search(
+            rb'name="csrfmiddlewaretoken" value="([^"]+)"', body).group(1)
+        status, headers, _ = call(
+            self.application, 'POST', login,
+            body=b'username=Tolstoy&password=war-and-peace'
+                 b'&csrfmiddlewaretoken=' + token,
+            headers=[(b'content-type', b'application/x-www-form-urlencoded'),
+                     (b'cookie', cookie)])
+        self.assertEqual(status, 302)
+        self.assertEqual(dict(headers)[b'location'],
+                         reverse('posts:index').encode())
+
+    def test_unknown_page(self):
+        status, _, _ = call(self.application, 'GET', '/nobody/at/all/')
+        self.assertEqual(status, 404)
+
+    def test_environ_keeps_unicode_path_and_headers(self):
+        environ = build_environ({
+            'method': 'GET', 'path': '/group/кот/', 'query_string': b'a=1',
+            'headers': [(b'cookie', b'a=1'), (b'cookie', b'b=2'),
+                        (b'content-type', b'text/plain')],
+        }, None)
+        self.assertEqual(environ['PATH_INFO'].encode('latin-1').decode(),
+                         '/group/кот/')
+        self.assertEqual(environ['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['QUERY_STRING'], 'a=1')
@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Post, UserStats
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=3, PAGE_CACHE_TIMEOUT=0)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        for number in range(7):
+            reader = User.objects.create_user(username=f'reader{number}')
+            Comment.objects.create(
+                post=cls.post, author=reader, text=f'комментарий {number}')
+        # Комментарии с одинаковой датой различаются по id.
+        Comment.objects.update(created=timezone.now())
+        cls.expected = [f'комментарий {number}' for number in range(7)]
+        cls.url = reverse('posts:post', args=['Tolstoy', cls.post.pk])
+        cls.comments_url = reverse(
+            'posts:comments', args=['Tolstoy', cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_post_page_shows_first_comments_in_order(self):
+        response = self.guest_client.get(self.url)
+        comments = response.context['comments']
+        self.assertEqual([comment.text for comment in comments],
+                         self.expected[:3])
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, f'?after={comments.next_cursor}')
+
+    def test_load_more_walks_all_comments(self):
+        first = self.guest_client.get(self.url).context['comments']
+        texts = [comment.text for comment in first]
+        after = first.next_cursor
+        while after:
+            data = self.guest_client.get(
+                self.comments_url, {'after': after}).json()
+            texts += [text for text in self.expected if text in data['html']]
+            after = data['next']
+        self.assertEqual(texts, self.expected)
+
+    def test_authors_are_loaded_with_comments(self):
+        with CaptureQueriesContext(connection) as one_page:
+            self.guest_client.get(self.comments_url)
+        with override_settings(COMMENTS_PER_PAGE=7):
+            with CaptureQueriesContext(connection) as all_comments:
+                self.guest_client.get(self.comments_url)
+        self.assertEqual(len(all_comments), len(one_page))
+
+    def test_comments_of_missing_post(self):
+        response = self.guest_client.get(
+            reverse('posts:comments', args=['reader0', self.post.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class PostDeletionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Tolstoy')
+        self.readers = [User.objects.create_user(username=f'reader{number}')
+                        for number in range(2)]
+
+    def create_post(self, comments):
+        post = Post.objects.create(text='Пост', author=self.author)
+        for number in range(comments):
+            Comment.objects.create(post=post, author=self.readers[number % 2],
+                                   text=f'комментарий {number}')
+        return post
+
+    def test_comments_are_not_invalidated_one_by_one(self):
+        post = self.create_post(2)
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        post = self.create_post(20)
+        with self.assertNumQueries(len(queries)):
+            post.delete()
+        stats = UserStats.objects.filter(user__in=self.readers)
+        self.assertEqual(
+            list(stats.values_list('comment_count', flat=True)), [0, 0])
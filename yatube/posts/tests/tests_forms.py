@@ -94,6 +94,6 @@ class PostCreateFormTests(TestCase):
             follow=True
         )
         self.assertEqual(response.status_code, 200)
-        new_post_image = Post.objects.filter(
-            image='posts/small.gif').exists()
-        self.assertTrue(new_post_image)
+        new_post = Post.objects.get(text='этот пост с картинкой')
+        self.assertRegex(new_post.image.name, r'^posts/.+\.gif$')
+        self.assertTrue(new_post.image.storage.exists(new_post.image.name))
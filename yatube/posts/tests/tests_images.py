@@ -0,0 +1,108 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import images
+from ..models import Post
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_jpeg(size=(400, 100)):
+    exif = Image.Exif()
+    exif[0x010F] = 'Камера'
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 0, 0)).save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile('photo.jpeg', buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_MAX_SIZE=100)
+class ImageIngestionTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.staging_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging_root, ignore_errors=True)
+        staging = self.settings(IMAGE_STAGING_ROOT=self.staging_root)
+        staging.enable()
+        self.addCleanup(staging.disable)
+        self.author = User.objects.create_user(username='Tolstoy')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def create_post(self):
+        self.authorized_client.post(reverse('posts:new_post'), {
+            'text': 'пост с картинкой', 'image': make_jpeg()})
+        return Post.objects.get(author=self.author)
+
+    def test_upload_is_cleaned_and_downscaled(self):
+        post = self.create_post()
+        self.assertRegex(post.image.name, r'^posts/.+\.jpg$')
+        self.assertEqual(post.pending_image, '')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 25))
+            self.assertEqual(len(image.getexif()), 0)
+        self.assertTrue(post.thumbnail_urls)
+        self.assertEqual(os.listdir(self.staging_root), [])
+
+    @override_settings(BACKGROUND_WORKERS=1)
+    def test_placeholder_is_shown_until_processed(self):
+        post = self.create_post()
+        self.assertFalse(post.image)
+        self.assertTrue(post.pending_image)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Картинка обрабатывается')
+
+        images.ingest(post.pk, post.pending_image)
+        post.refresh_from_db()
+        self.assertRegex(post.image.name, r'^posts/.+\.jpg$')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Картинка обрабатывается')
+        self.assertContains(response, post.thumbnail_urls['card'])
+
+    @override_settings(BACKGROUND_WORKERS=1)
+    def test_replaced_upload_is_discarded(self):
+        post = self.create_post()
+        first = post.pending_image
+        post.image = make_jpeg()
+        post.save()
+        images.ingest(post.pk, first)
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertEqual(
+            os.listdir(self.staging_root), [post.pending_image])
+
+    def test_multipage_tiff_is_reencoded(self):
+        path = os.path.join(self.staging_root, 'pages.tiff')
+        frames = [Image.new('RGB', (20, 20), color)
+                  for color in ((200, 0, 0), (0, 200, 0))]
+        frames[0].save(path, 'TIFF', save_all=True,
+                       append_images=frames[1:])
+        extension, content = images.process_file(path, 100, 85)
+        self.assertEqual(extension, '.jpg')
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual(image.size, (20, 20))
+
+    @override_settings(BACKGROUND_WORKERS=1)
+    def test_unexpected_error_clears_placeholder(self):
+        post = self.create_post()
+        with mock.patch.object(images, '_process', side_effect=KeyError), \
+                self.assertLogs('posts.images', 'ERROR'):
+            images.ingest(post.pk, post.pending_image)
+        post.refresh_from_db()
+        self.assertEqual(post.pending_image, '')
+        self.assertEqual(os.listdir(self.staging_root), [])
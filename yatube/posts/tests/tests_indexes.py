@@ -0,0 +1,92 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\S+( AS \S+)?$')
+
+
+@override_settings(TIMELINE_ENABLED=True)
+class QueryPlanTests(TestCase):
+    """Запросы страниц ленты читаются по индексам, без полного
+    сканирования таблиц и без сортировки во временном B-дереве."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+        cls.reader = User.objects.create_user(username='Dostoevskiy')
+        cls.group = Group.objects.create(
+            title='Red Hot Chilly Peppers',
+            slug='RHCP',
+            description='Тестовый текст для описания группы'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(15):
+            cls.post = Post.objects.create(
+                text=f'тестовый текст поста {number}',
+                author=cls.author,
+                group=cls.group,
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def query_plans(self, url, data=None):
+        self.authorized_client.get(url, data)
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url, data)
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                yield query['sql'], [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlans(self, url, data=None):
+        for sql, plan in self.query_plans(url, data):
+            for step in plan:
+                with self.subTest(url=url, data=data, sql=sql):
+                    self.assertNotRegex(step, FULL_SCAN)
+                    self.assertNotIn('USE TEMP B-TREE', step)
+
+    def test_feed_pages_are_read_by_index(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:post', kwargs={
+                'username': self.author.username, 'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            self.assertIndexedPlans(url)
+            self.assertIndexedPlans(url, {'page': 2})
+
+    @override_settings(CURSOR_PAGINATED_FEEDS=('index', 'group', 'profile'),
+                       PAGES=5)
+    def test_cursor_pages_are_read_by_index(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+        ]
+        for url in urls:
+            response = self.authorized_client.get(url)
+            cursor = response.context['page'].next_cursor
+            self.assertIndexedPlans(url, {'after': cursor})
+            self.assertIndexedPlans(url, {'before': cursor})
@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .. import thumbnails
+from ..kvstore import KVStore
+from ..models import Post
+from .tests_thumbnails import make_gif
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_LRU_CHECK_INTERVAL=0)
+class KVStoreTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        for number in range(3):
+            Post.objects.create(
+                text=f'пост {number}', author=self.author,
+                image=SimpleUploadedFile(
+                    f'small{number}.gif', make_gif((number, 0, 0)),
+                    'image/gif'))
+        self.urls = [post.thumbnail_urls for post in self.fresh_posts()]
+        # Как у постов, загруженных до фоновой генерации миниатюр.
+        Post.objects.update(thumbnails='')
+
+    def fresh_posts(self):
+        return list(Post.objects.order_by('pk'))
+
+    def test_page_thumbnails_are_resolved_in_one_lookup(self):
+        cache.clear()
+        posts = self.fresh_posts()
+        with self.assertNumQueries(1):
+            thumbnails.resolve(posts)
+        self.assertEqual([post.thumbnail_urls for post in posts], self.urls)
+        posts = self.fresh_posts()
+        with self.assertNumQueries(0), \
+                mock.patch.object(cache, 'get_many') as get_many:
+            thumbnails.resolve(posts)
+        get_many.assert_not_called()
+        self.assertEqual([post.thumbnail_urls for post in posts], self.urls)
+
+    def test_writes_invalidate_other_processes(self):
+        other = KVStore()
+        source = thumbnails.ImageFile(self.fresh_posts()[0].image)
+        self.assertIsNotNone(other.get(source))
+        default.kvstore.delete(source, delete_thumbnails=False)
+        self.assertIsNone(other.get(source))
+
+    @override_settings(THUMBNAIL_LRU_SIZE=2)
+    def test_lru_is_bounded(self):
+        store = KVStore()
+        store.get_many(
+            [thumbnails.ImageFile(post.image) for post in self.fresh_posts()])
+        self.assertEqual(len(store._lru), 2)
+
+    def test_rebuild_restores_metadata_without_decoding(self):
+        default.kvstore.clear()
+        cache.clear()
+        self.assertEqual(KVStoreModel.objects.count(), 0)
+        with mock.patch.object(default.engine, 'get_image',
+                               side_effect=AssertionError('декодирование')):
+            call_command('rebuild_thumbnail_store', stdout=mock.Mock())
+        posts = thumbnails.resolve(self.fresh_posts())
+        self.assertEqual([post.thumbnail_urls for post in posts], self.urls)
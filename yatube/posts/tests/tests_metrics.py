@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..metrics import registry
+from ..models import Post
+from .tests_thumbnails import SMALL_GIF
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_SLOW_REQUEST_SECONDS=60,
+                   PAGE_CACHE_TIMEOUT=0, MEDIA_ROOT=MEDIA_ROOT)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        # Middleware включается при первом запросе нового клиента.
+        self.client = Client()
+
+    def metrics(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_request_metrics_by_url_name(self):
+        Post.objects.create(text='Пост', author=self.author)
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:profile', args=['Tolstoy']))
+        text = self.metrics()
+        for line in (
+                'yatube_request_seconds_count{view="posts:index"} 2',
+                'yatube_request_seconds_count{view="posts:profile"} 1',
+                'yatube_request_queries_bucket'
+                '{view="posts:index",le="0"} 0',
+                'yatube_request_template_seconds_count'
+                '{view="posts:index"} 2',
+                'yatube_requests_total{view="posts:index",status="200"} 2',
+                '# TYPE yatube_request_db_seconds histogram'):
+            with self.subTest(line=line):
+                self.assertIn(line, text)
+        self.assertNotIn('view="metrics"', text)
+
+    def test_cache_hits_and_misses(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.metrics()
+        self.assertIn(
+            'yatube_cache_gets_total{view="posts:index",result="hit"}', text)
+        self.assertIn(
+            'yatube_cache_gets_total{view="posts:index",result="miss"}', text)
+
+    def test_thumbnail_calls(self):
+        client = Client()
+        client.force_login(self.author)
+        client.post(reverse('posts:new_post'), {
+            'text': 'пост с картинкой',
+            'image': SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        })
+        self.assertIn('yatube_thumbnail_calls_total{view="posts:new_post"}',
+                      self.metrics())
+
+    def test_slow_request_log_has_worst_sql(self):
+        with override_settings(METRICS_SLOW_REQUEST_SECONDS=0):
+            with self.assertLogs('posts.metrics', 'WARNING') as logs:
+                self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_streamed_response_is_measured_after_body(self):
+        for number in range(3):
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+        response = self.client.get(reverse('api:posts'))
+        self.assertNotIn('view="api:posts"', registry.render())
+        b''.join(response.streaming_content)
+        response.close()
+        text = self.metrics()
+        self.assertIn('yatube_request_seconds_count{view="api:posts"} 1',
+                      text)
+        # Посты читаются, пока тело ответа отдаётся клиенту.
+        self.assertIn('yatube_request_queries_bucket'
+                      '{view="api:posts",le="0"} 0', text)
+
+    def test_endpoint_access(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_disabled(self):
+        with override_settings(METRICS_ENABLED=False):
+            client = Client()
+            client.get(reverse('posts:index'))
+            response = client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(registry.histograms, {})
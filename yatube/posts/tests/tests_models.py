@@ -1,7 +1,13 @@
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import (Comment, Follow, Group, Post, UserStats,
+                      UserStatsQuerySet)
 
 User = get_user_model()
 
@@ -29,3 +35,66 @@ class ModelTest(TestCase):
     def test_group_str(self):
         post_test_group = str(self.group)
         self.assertEqual(post_test_group, 'RHCP')
+
+
+class UserStatsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='Tolstoy')
+        self.reader = User.objects.create_user(username='Dostoevskiy')
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(user=user.username, field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_writes(self):
+        posts = [Post.objects.create(text='текст', author=self.author)
+                 for _ in range(3)]
+        Comment.objects.create(post=posts[0], author=self.reader, text='1')
+        Comment.objects.create(post=posts[1], author=self.reader, text='2')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertStats(self.author, post_count=3, follower_count=1)
+        self.assertStats(self.reader, comment_count=2, following_count=1)
+
+        posts[0].delete()
+        self.assertStats(self.author, post_count=2)
+        self.assertStats(self.reader, comment_count=1)
+
+        Post.objects.filter(author=self.author).delete()
+        Follow.objects.all().delete()
+        self.assertStats(self.author, post_count=0, follower_count=0)
+        self.assertStats(self.reader, comment_count=0, following_count=0)
+
+    def test_rebuild_command(self):
+        post = Post.objects.create(text='текст', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='1')
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.update(
+            post_count=100, comment_count=100,
+            follower_count=100, following_count=100)
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertStats(self.author, post_count=1, follower_count=1,
+                         comment_count=0, following_count=0)
+        self.assertStats(self.reader, post_count=0, follower_count=0,
+                         comment_count=1, following_count=1)
+
+    def test_missing_stats_are_rebuilt_on_read(self):
+        Post.objects.create(text='текст', author=self.author)
+        UserStats.objects.filter(user=self.author).delete()
+        author = User.objects.get(pk=self.author.pk)
+        self.assertEqual(UserStats.objects.for_user(author).post_count, 1)
+
+    def test_concurrent_rebuild_of_missing_stats(self):
+        UserStats.objects.filter(user=self.author).delete()
+        author = User.objects.get(pk=self.author.pk)
+        rebuild = UserStatsQuerySet.rebuild
+
+        def raced(queryset, user_ids=None):
+            # Другой запрос успел пересоздать строку первым.
+            rebuild(queryset, user_ids)
+            raise IntegrityError
+
+        with mock.patch.object(UserStatsQuerySet, 'rebuild', raced):
+            stats = UserStats.objects.for_user(author)
+        self.assertEqual(stats.user_id, author.pk)
@@ -0,0 +1,281 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from .. import page_cache
+from ..metrics import registry
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+        cls.reader = User.objects.create_user(username='Dostoevskiy')
+        cls.group = Group.objects.create(
+            title='Red Hot Chilly Peppers',
+            slug='RHCP',
+            description='Тестовый текст для описания группы'
+        )
+        cls.post = Post.objects.create(
+            text='тестовый текст поста', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:post', kwargs={
+                'username': self.author.username, 'post_id': self.post.pk}),
+        ]
+
+    def assertCached(self, url, cached=True):
+        response = self.guest_client.get(url)
+        self.assertEqual(
+            response['X-Page-Cache'], 'HIT' if cached else 'MISS')
+        return response
+
+    def warm(self):
+        for url in self.urls:
+            self.guest_client.get(url)
+
+    def test_anonymous_pages_are_cached(self):
+        self.warm()
+        for url in self.urls:
+            with self.subTest(url=url):
+                with self.assertNumQueries(0):
+                    self.assertCached(url)
+        self.assertEqual(page_cache.stats(), {'hits': 4, 'misses': 4})
+
+    def test_query_string_is_part_of_key(self):
+        self.warm()
+        self.assertCached(self.urls[0] + '?page=2', cached=False)
+
+    def test_authorized_pages_are_not_cached(self):
+        self.author_client.get(self.urls[0])
+        response = self.author_client.get(self.urls[0])
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_new_post_invalidates_feeds(self):
+        self.warm()
+        self.author_client.post(reverse('posts:new_post'), {
+            'text': 'свежий пост', 'group': self.group.pk})
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.assertCached(url, cached=False)
+                self.assertContains(response, 'свежий пост')
+        self.assertCached(self.urls[3])
+
+    def test_edit_invalidates_old_and_new_group(self):
+        other = Group.objects.create(
+            title='Другая', slug='other', description='описание')
+        other_url = reverse('posts:group', kwargs={'slug': other.slug})
+        self.warm()
+        self.guest_client.get(other_url)
+        self.author_client.post(
+            reverse('posts:edit', kwargs={
+                'username': self.author.username, 'post_id': self.post.pk}),
+            {'text': 'изменённый текст', 'group': other.pk})
+        for url in self.urls + [other_url]:
+            with self.subTest(url=url):
+                self.assertCached(url, cached=False)
+
+    def test_comment_invalidates_post_and_feeds(self):
+        self.warm()
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='комментарий')
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertCached(url, cached=False)
+
+    def test_group_change_invalidates_all_cards(self):
+        self.warm()
+        self.group.title = 'Новое название'
+        self.group.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.assertCached(url, cached=False), 'Новое название')
+
+    def test_follow_invalidates_profiles(self):
+        self.warm()
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertCached(self.urls[2], cached=False)
+        self.assertCached(self.urls[0])
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+        cls.reader = User.objects.create_user(username='Dostoevskiy')
+        cls.post = Post.objects.create(
+            text='тестовый текст поста', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.edit_url = reverse('posts:edit', kwargs={
+            'username': self.author.username, 'post_id': self.post.pk})
+
+    def test_edit_button_is_rendered_per_viewer(self):
+        self.reader_client.get(reverse('posts:index'))
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, self.edit_url)
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertNotContains(response, self.edit_url)
+
+    def test_cached_card_is_balanced(self):
+        self.reader_client.get(reverse('posts:index'))
+        post, = page_cache.with_card_versions([self.post])
+        fragment = cache.get(make_template_fragment_key(
+            'post_card', [post.pk, post.card_version, False]))
+        self.assertTrue(fragment.strip().startswith('<div class="card '))
+        self.assertTrue(fragment.strip().endswith('</div>'))
+        self.assertEqual(fragment.count('<div'), fragment.count('</div>'))
+
+    def test_card_is_rerendered_after_changes(self):
+        self.reader_client.get(reverse('posts:index'))
+        self.author_client.post(self.edit_url, {'text': 'новый текст'})
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='комментарий')
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertContains(response, 'новый текст')
+        self.assertContains(response, 'Комментариев: 1')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+        cls.reader = User.objects.create_user(username='Dostoevskiy')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            text='тестовый текст поста', author=cls.author, group=cls.group)
+        cls.other = Post.objects.create(
+            text='другой пост', author=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.post_url = reverse('posts:post', kwargs={
+            'username': self.author.username, 'post_id': self.post.pk})
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            self.post_url,
+        ]
+
+    def etag(self, url, client=None):
+        return (client or self.guest_client).get(url)['ETag']
+
+    def test_unchanged_pages_are_not_rendered(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                etag = response['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+                self.assertEqual(response['ETag'], etag)
+                response = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_in_scope_change_etag(self):
+        etags = {url: self.etag(url) for url in self.urls}
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='комментарий')
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etags[url])
+
+    def test_changes_out_of_scope_keep_etag(self):
+        etag = self.etag(self.post_url)
+        Comment.objects.create(
+            post=self.other, author=self.reader, text='комментарий')
+        response = self.guest_client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_viewer(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(
+                    self.etag(url), self.etag(url, self.reader_client))
+
+    def test_new_csrf_token_changes_etag(self):
+        # Вход заново меняет CSRF-токен: страница со старым токеном в
+        # формах вернула бы 403 при отправке.
+        self.reader_client.get(self.post_url)  # Получить CSRF-cookie.
+        response = self.reader_client.get(self.post_url)
+        etag = response['ETag']
+        response = self.reader_client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.reader_client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 32
+        response = self.reader_client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_hit_rate_is_in_metrics(self):
+        url = reverse('posts:index')
+        etag = self.etag(url)
+        self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.guest_client.get(url, HTTP_IF_NONE_MATCH='"old"')
+        text = registry.render()
+        self.assertIn('yatube_conditional_requests_total{view="posts:index",'
+                      'result="hit"} 1', text)
+        self.assertIn('yatube_conditional_requests_total{view="posts:index",'
+                      'result="miss"} 1', text)
+
+
+class CommitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Tolstoy')
+        self.post = Post.objects.create(
+            text='тестовый текст поста', author=self.author)
+
+    def test_versions_change_again_after_commit(self):
+        tags = [f'post:{self.post.pk}', 'feed']
+        before = page_cache.get_versions(tags)
+        with transaction.atomic():
+            Comment.objects.create(
+                post=self.post, author=self.author, text='комментарий')
+            # Страницу, прочитанную до коммита, закешируют под этими
+            # версиями.
+            during = page_cache.get_versions(tags)
+            self.assertNotEqual(during, before)
+        after = page_cache.get_versions(tags)
+        for version, old in zip(after, during):
+            self.assertNotEqual(version, old)
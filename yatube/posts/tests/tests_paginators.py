@@ -0,0 +1,132 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from ..counters import post_count
+from ..models import Follow, Group, Post
+from ..paginators import CountingPaginator, CursorPaginator
+from ..templatetags.paginator_tags import page_window
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+        for number in range(23):
+            Post.objects.create(
+                text=f'тестовый текст поста {number}', author=cls.author)
+        # Половина постов с одинаковой датой: курсор должен различать их
+        # по id.
+        Post.objects.filter(id__lte=12).update(pub_date=timezone.now())
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_walk_forward_and_back(self):
+        paginator = CursorPaginator(Post.objects.all(), 5)
+        page = paginator.get_page()
+        self.assertFalse(page.has_previous())
+        pages = [page]
+        while page.has_next():
+            page = paginator.get_page(after=page.next_cursor)
+            pages.append(page)
+        seen = [post.id for page in pages for post in page]
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 5)
+
+        back = []
+        while page.has_previous():
+            page = paginator.get_page(before=page.previous_cursor)
+            back.append([post.id for post in page])
+        self.assertEqual(
+            back[::-1], [[post.id for post in page] for page in pages[:-1]])
+
+    def test_broken_cursor_returns_first_page(self):
+        paginator = CursorPaginator(Post.objects.all(), 5)
+        for cursor in ('garbage', 'WzFd', '!!!'):
+            with self.subTest(cursor=cursor):
+                page = paginator.get_page(after=cursor)
+                self.assertEqual(
+                    [post.id for post in page], self.expected[:5])
+
+    @override_settings(CURSOR_PAGINATED_FEEDS=('index',), PAGES=10)
+    def test_index_uses_cursor_links(self):
+        response = self.guest_client.get(reverse('posts:index'))
+        page = response.context['page']
+        self.assertContains(response, f'?after={page.next_cursor}')
+        self.assertNotContains(response, '?page=')
+        response = self.guest_client.get(
+            reverse('posts:index'), {'after': page.next_cursor})
+        self.assertEqual(
+            [post.id for post in response.context['page']],
+            self.expected[10:20])
+
+
+class CountingPaginatorTests(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='Tolstoy')
+        self.reader = User.objects.create_user(username='Dostoevskiy')
+        self.group = Group.objects.create(
+            title='Red Hot Chilly Peppers',
+            slug='RHCP',
+            description='Тестовый текст для описания группы'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+
+    def test_counts_follow_creates_edits_and_deletes(self):
+        scopes = ('all', f'group:{self.group.pk}',
+                  f'author:{self.author.pk}', f'follow:{self.reader.pk}')
+        for scope in scopes:
+            self.assertEqual(post_count(scope), 0)
+        posts = [Post.objects.create(text='текст', author=self.author,
+                                     group=self.group) for _ in range(3)]
+        posts[0].group = None
+        posts[0].save()
+        posts[1].delete()
+        expected = {'all': 2, f'group:{self.group.pk}': 1,
+                    f'author:{self.author.pk}': 2,
+                    f'follow:{self.reader.pk}': 2}
+        with self.assertNumQueries(2):
+            for scope, count in expected.items():
+                with self.subTest(scope=scope):
+                    self.assertEqual(post_count(scope), count)
+
+    def test_rolled_back_post_is_not_counted(self):
+        post_count('all')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Post.objects.create(text='текст', author=self.author)
+            raise RuntimeError
+        self.assertEqual(post_count('all'), 0)
+
+    def test_paginator_does_not_count_when_cached(self):
+        Post.objects.create(text='текст', author=self.author)
+        post_count('all')
+        paginator = CountingPaginator(Post.objects.all(), 10, 'all')
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.num_pages, 1)
+
+    def test_page_window(self):
+        paginator = CountingPaginator(Post.objects.all(), 1, 'all')
+        paginator.count = 10000
+        cases = {
+            1: [1, 2, 3, None, 10000],
+            4: [1, 2, 3, 4, 5, 6, None, 10000],
+            500: [1, None, 498, 499, 500, 501, 502, None, 10000],
+            10000: [1, None, 9998, 9999, 10000],
+        }
+        for number, expected in cases.items():
+            with self.subTest(number=number):
+                page = paginator._get_page([], number, paginator)
+                self.assertEqual(page_window(page), expected)
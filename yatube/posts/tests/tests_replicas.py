@@ -0,0 +1,88 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post
+from ..replicas import PIN_COOKIE
+
+User = get_user_model()
+
+# В настройках по умолчанию реплик нет. Тестовая реплика добавляется при
+# импорте модуля, до создания тестовых баз.
+connections.databases.setdefault('replica', {
+    'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'})
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], PAGE_CACHE_TIMEOUT=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Tolstoy')
+        self.reader = User.objects.create_user(username='Dostoevskiy')
+        self.sync()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.sync()
+        # Вход тоже запись; забываем закрепление, как через 10 секунд.
+        for client in (self.author_client, self.reader_client):
+            client.cookies.pop(PIN_COOKIE, None)
+
+    def sync(self):
+        call_command('sync_replicas', stdout=StringIO())
+
+    def index_texts(self, client):
+        response = client.get(reverse('posts:index'))
+        return [post.text for post in response.context['page']]
+
+    def test_writes_go_to_primary_and_reads_to_replica(self):
+        self.author_client.post(
+            reverse('posts:new_post'), {'text': 'новый пост'})
+        self.assertEqual(Post.objects.using('default').count(), 1)
+        self.assertEqual(Post.objects.using('replica').count(), 0)
+        self.assertEqual(self.index_texts(self.reader_client), [])
+        self.sync()
+        self.assertEqual(self.index_texts(self.reader_client), ['новый пост'])
+
+    def test_author_reads_own_writes(self):
+        response = self.author_client.post(
+            reverse('posts:new_post'), {'text': 'новый пост'}, follow=True)
+        self.assertIn(PIN_COOKIE, self.author_client.cookies)
+        self.assertEqual(
+            [post.text for post in response.context['page']], ['новый пост'])
+        post = Post.objects.get()
+        url = reverse('posts:post', args=[self.author.username, post.pk])
+        self.sync()
+        self.author_client.post(
+            reverse('posts:add_comment',
+                    args=[self.author.username, post.pk]),
+            {'text': 'комментарий'})
+        response = self.author_client.get(url)
+        self.assertEqual(len(response.context['comments']), 1)
+        response = self.reader_client.get(url)
+        self.assertEqual(len(response.context['comments']), 0)
+
+    def test_follow_pins_follower(self):
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.assertTrue(Follow.objects.exists())
+        response = self.reader_client.get(
+            reverse('posts:profile', args=[self.author.username]))
+        self.assertTrue(response.context['following'])
+
+    def test_reads_without_writes_are_not_pinned(self):
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=60)
+    def test_cached_anonymous_pages_are_rendered_from_primary(self):
+        Post.objects.create(text='новый пост', author=self.author)
+        self.assertEqual(self.index_texts(Client()), ['новый пост'])
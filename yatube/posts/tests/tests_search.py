@@ -0,0 +1,115 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Group, Post
+from ..stemmer import stem
+
+User = get_user_model()
+
+
+class StemmerTests(TestCase):
+    def test_russian_word_forms_share_stem(self):
+        forms = {
+            'красив': ['красивая', 'красивые', 'красивыми'],
+            'лисиц': ['лисица', 'лисицы', 'лисицей'],
+            'безопасн': ['безопасность', 'безопасности'],
+            'ежик': ['Ёжики', 'ежиком'],
+        }
+        for expected, words in forms.items():
+            for word in words:
+                with self.subTest(word=word):
+                    self.assertEqual(stem(word), expected)
+
+    def test_latin_words_are_lowercased(self):
+        self.assertEqual(stem('Django'), 'django')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+        cls.other = User.objects.create_user(username='Dostoevskiy')
+        cls.group = Group.objects.create(
+            title='Red Hot Chilly Peppers', slug='RHCP',
+            description='Тестовый текст для описания группы')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def found(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [post.text for post in response.context['page']]
+
+    def test_index_follows_saves_and_deletes(self):
+        post = Post.objects.create(
+            text='Красивые лисицы бегали по лесу', author=self.author)
+        self.assertEqual(self.found('лисица'), [post.text])
+        post.text = 'Ежики в тумане'
+        post.save()
+        self.assertEqual(self.found('лисица'), [])
+        self.assertEqual(self.found('ёжик'), [post.text])
+        post.delete()
+        self.assertEqual(self.found('ёжик'), [])
+
+    def test_ranking_and_filters(self):
+        Post.objects.create(text='кот и пёс', author=self.author)
+        best = Post.objects.create(
+            text='кот, коты, котом', author=self.other, group=self.group)
+        self.assertEqual(self.found('коты')[0], best.text)
+        self.assertEqual(self.found('кот', group='RHCP'), [best.text])
+        self.assertEqual(self.found('кот', author='Tolstoy'), ['кот и пёс'])
+
+    def test_query_syntax_is_not_interpreted(self):
+        Post.objects.create(text='NEAR или OR', author=self.author)
+        for query in ('"', 'OR', 'кот*', 'NEAR(', '-'):
+            with self.subTest(query=query):
+                self.found(query)
+
+    def test_keyset_pagination(self):
+        for number in range(25):
+            Post.objects.create(
+                text=f'пост про котов номер {number}', author=self.author)
+        seen = []
+        page = search.search('кот', per_page=10)
+        seen += [post.pk for post in page]
+        while page.has_next():
+            page = search.search('кот', after=page.next_cursor, per_page=10)
+            seen += [post.pk for post in page]
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_rebuild_command(self):
+        post = Post.objects.create(text='лисица', author=self.author)
+        search.get_backend().remove(post.pk)
+        self.assertEqual(self.found('лисица'), [])
+        call_command('rebuild_search_index', stdout=None)
+        self.assertEqual(self.found('лисица'), [post.text])
+
+    def test_admin_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        Post.objects.create(text='Красивые лисицы', author=self.author)
+        Post.objects.create(text='кот', author=self.author)
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'лисица'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class PostgresBackendTests(TestCase):
+    def test_query_uses_indexed_expression(self):
+        # Выражение должно совпадать с GIN-индексом миграции 0013.
+        sql = str(search.PostgresBackend().filter(
+            Post.objects.all(), 'лиса').query)
+        self.assertIn(
+            '''WHERE to_tsvector('russian', "posts_post"."text") @@''', sql)
+        self.assertNotIn('COALESCE', sql)
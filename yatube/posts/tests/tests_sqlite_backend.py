@@ -0,0 +1,83 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+
+class ProductionSQLiteTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'db.sqlite3')
+
+    def connect(self, **options):
+        connections = ConnectionHandler({'default': {
+            'ENGINE': 'posts.backends.sqlite3',
+            'NAME': self.path,
+            'OPTIONS': options,
+        }})
+        connection = connections['default']
+        self.addCleanup(connection.close)
+        return connection
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def lock_for(self, seconds):
+        """Держать блокировку записи из другого соединения ``seconds``
+        секунд."""
+        other = sqlite3.connect(self.path, check_same_thread=False)
+        other.isolation_level = None
+        other.execute('BEGIN IMMEDIATE')
+        timer = threading.Timer(seconds, other.execute, ['COMMIT'])
+        timer.start()
+        self.addCleanup(other.close)
+        self.addCleanup(timer.join)
+
+    def test_pragmas(self):
+        connection = self.connect(pragmas={'busy_timeout': 1234})
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 1234)
+        self.assertEqual(self.pragma(connection, 'cache_size'), -65536)
+
+    def test_locked_writes_are_retried(self):
+        connection = self.connect(
+            pragmas={'busy_timeout': 0}, write_retries=10,
+            retry_backoff=0.02)
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        self.lock_for(0.2)
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO item VALUES (1)')
+
+    def test_transactions_take_write_lock_at_begin(self):
+        connection = self.connect(
+            pragmas={'busy_timeout': 0}, write_retries=10,
+            retry_backoff=0.02)
+        connection.ensure_connection()
+        self.lock_for(0.2)
+        # Так transaction.atomic начинает транзакцию; ожидание — здесь.
+        connection._start_transaction_under_autocommit()
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+            other.execute('BEGIN IMMEDIATE')
+        connection.connection.rollback()
+
+    def test_gives_up_after_retries(self):
+        connection = self.connect(
+            pragmas={'busy_timeout': 0}, write_retries=2, retry_backoff=0.01)
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        self.lock_for(1)
+        with self.assertRaises(OperationalError):
+            with connection.cursor() as cursor:
+                cursor.execute('INSERT INTO item VALUES (1)')
@@ -0,0 +1,81 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post
+from .tests_thumbnails import SMALL_GIF
+
+User = get_user_model()
+
+
+class ContentAddressedStorageTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.author = User.objects.create_user(username='Tolstoy')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def create_post(self, text, name):
+        self.authorized_client.post(reverse('posts:new_post'), {
+            'text': text,
+            'image': SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        })
+        return Post.objects.get(text=text)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root)
+            for name in names)
+
+    def test_identical_uploads_share_file_and_thumbnails(self):
+        first = self.create_post('оригинал', 'frog.gif')
+        repost = self.create_post('репост', 'Crazy_Frog.gif')
+        self.assertEqual(first.image.name, repost.image.name)
+        self.assertRegex(first.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        self.assertEqual(first.thumbnail_urls, repost.thumbnail_urls)
+        self.assertEqual(
+            len(self.stored_files()), 1 + len(settings.POST_THUMBNAILS))
+
+    def test_file_is_deleted_with_last_post(self):
+        first = self.create_post('оригинал', 'frog.gif')
+        repost = self.create_post('репост', 'Crazy_Frog.gif')
+        files = self.stored_files()
+        first.delete()
+        self.assertEqual(self.stored_files(), files)
+        repost.delete()
+        self.assertEqual(self.stored_files(), [])
+
+    def test_dedupe_moves_old_uploads(self):
+        storage = FileSystemStorage()
+        for name in ('posts/frog.gif', 'posts/frog_copy.gif'):
+            storage.save(name, ContentFile(SMALL_GIF))
+        Post.objects.bulk_create([
+            Post(text='оригинал', author=self.author, image='posts/frog.gif'),
+            Post(text='копия', author=self.author,
+                 image='posts/frog_copy.gif')])
+        call_command('dedupe_images', stdout=io.StringIO())
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertFalse(storage.exists('posts/frog.gif'))
+        self.assertFalse(storage.exists('posts/frog_copy.gif'))
+        self.assertTrue(storage.exists(names.pop()))
+        self.assertTrue(all(
+            post.thumbnail_urls for post in Post.objects.all()))
@@ -0,0 +1,103 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_gif(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 2), color).save(buffer, 'GIF')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Tolstoy')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def create_post(self, name='small.gif'):
+        self.authorized_client.post(reverse('posts:new_post'), {
+            'text': 'пост с картинкой',
+            'image': SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        })
+        return Post.objects.get(author=self.author)
+
+    def test_thumbnails_are_generated_on_upload(self):
+        post = self.create_post()
+        urls = post.thumbnail_urls
+        self.assertEqual(set(urls), set(settings.POST_THUMBNAILS))
+        path = urls['card'][len(settings.MEDIA_URL):]
+        self.assertTrue(os.path.exists(os.path.join(MEDIA_ROOT, path)))
+
+    def test_feed_does_not_resize_images(self):
+        post = self.create_post()
+        with mock.patch(
+                'sorl.thumbnail.base.ThumbnailBackend.get_thumbnail',
+                side_effect=AssertionError('миниатюра в запросе')):
+            response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, post.thumbnail_urls['card'])
+
+    def test_new_image_replaces_thumbnails(self):
+        post = self.create_post()
+        old_urls = post.thumbnail_urls
+        post.image = SimpleUploadedFile(
+            'other.gif', make_gif((0, 0, 255)), 'image/gif')
+        post.save()
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail_urls)
+        self.assertNotEqual(post.thumbnail_urls, old_urls)
+
+    def test_card_offers_webp_srcset_with_jpeg_fallback(self):
+        post = self.create_post()
+        urls = post.thumbnail_urls
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(
+            response,
+            f'srcset="{urls["card_webp_480"]} 480w, '
+            f'{urls["card_webp_720"]} 720w, {urls["card_webp"]} 960w"')
+        self.assertContains(response, f'src="{urls["card"]}"')
+        self.assertTrue(urls['card_webp'].endswith('.webp'))
+        self.assertTrue(urls['card'].endswith('.jpg'))
+
+    def test_transparent_image_gets_jpeg_fallback(self):
+        buffer = io.BytesIO()
+        Image.new('P', (20, 20), 0).save(buffer, 'GIF', transparency=0)
+        self.authorized_client.post(reverse('posts:new_post'), {
+            'text': 'прозрачная картинка',
+            'image': SimpleUploadedFile(
+                'clear.gif', buffer.getvalue(), 'image/gif'),
+        })
+        post = Post.objects.get(text='прозрачная картинка')
+        self.assertEqual(
+            set(post.thumbnail_urls), set(settings.POST_THUMBNAILS))
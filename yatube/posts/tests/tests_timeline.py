@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import timeline
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+@override_settings(TIMELINE_ENABLED=True, TIMELINE_MAX_LENGTH=5,
+                   TIMELINE_FANOUT_LIMIT=2, PAGES=10)
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Tolstoy')
+        self.reader = User.objects.create_user(username='Dostoevskiy')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def feed_ids(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return [post.pk for post in response.context['page']]
+
+    def test_new_posts_fan_out_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='текст', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed_ids(), [post.pk])
+
+    def test_follow_backfills_and_timeline_is_capped(self):
+        posts = [Post.objects.create(text=f'текст {number}',
+                                     author=self.author)
+                 for number in range(8)]
+        self.authorized_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}))
+        expected = [post.pk for post in posts[::-1][:5]]
+        self.assertEqual(self.feed_ids(), expected)
+        Post.objects.create(text='новый', author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5)
+
+    def test_unfollow_removes_author_posts(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='текст', author=self.author)
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_popular_authors_are_read_on_demand(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=self.author)
+        post = Post.objects.create(text='текст', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed_ids(), [post.pk])
+
+    def test_backfill_after_unfollow_adds_nothing(self):
+        Post.objects.create(text='текст', author=self.author)
+        # Отписка обработана раньше подписки.
+        timeline.remove_author(self.reader.pk, self.author.pk)
+        timeline.backfill(self.reader.pk, self.author.pk)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_unfollow_during_backfill_wins(self):
+        Post.objects.create(text='текст', author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        bulk_create = TimelineEntry.objects.bulk_create
+
+        def unfollow_first(*args, **kwargs):
+            with mock.patch.object(timeline, 'is_enabled', return_value=False):
+                follow.delete()
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(
+                TimelineEntry.objects, 'bulk_create', unfollow_first):
+            timeline.backfill(self.reader.pk, self.author.pk)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_unfollow_during_fan_out_wins(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch.object(timeline, 'is_enabled', return_value=False):
+            post = Post.objects.create(text='текст', author=self.author)
+        followers = timeline._followers
+
+        def unfollow_after_read(author_id, user_ids):
+            result = followers(author_id, user_ids)
+            Follow.objects.filter(pk=follow.pk).delete()
+            return result
+
+        with mock.patch.object(timeline, '_followers', unfollow_after_read):
+            timeline.fan_out(post.pk)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .. import search, transfer
+from ..models import Comment, Follow, Group, Post, UserStats
+from .tests_thumbnails import make_gif
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+PUB_DATE = datetime(2020, 5, 17, 12, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TransferTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def create_content(self):
+        tolstoy = User.objects.create_user(username='Tolstoy')
+        reader = User.objects.create_user(username='Dostoevskiy')
+        group = Group.objects.create(
+            title='Red Hot Chilly Peppers', slug='RHCP',
+            description='Тестовый текст для описания группы')
+        for number in range(5):
+            post = Post.objects.create(
+                text=f'лисица номер {number}, "в кавычках"\nи с переносом',
+                author=tolstoy, group=group if number % 2 else None)
+            Comment.objects.create(
+                post=post, author=reader, text=f'комментарий {number}')
+        Post.objects.update(pub_date=PUB_DATE)
+        Follow.objects.create(user=reader, author=tolstoy)
+
+    def snapshot(self):
+        return (
+            sorted(Group.objects.values_list('slug', 'title', 'description')),
+            sorted(Post.objects.values_list(
+                'text', 'pub_date', 'author__username', 'group__slug')),
+            sorted(Comment.objects.values_list(
+                'post__text', 'author__username', 'text')),
+            sorted(Follow.objects.values_list(
+                'user__username', 'author__username')),
+        )
+
+    def clear(self):
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_round_trip(self):
+        self.create_content()
+        expected = self.snapshot()
+        for fmt in transfer.FORMATS:
+            with self.subTest(fmt=fmt):
+                directory = os.path.join(self.directory, fmt)
+                call_command('export_content', directory, format=fmt,
+                             stdout=StringIO())
+                self.clear()
+                output = StringIO()
+                call_command('import_content', directory, format=fmt,
+                             stdout=output)
+                self.assertEqual(self.snapshot(), expected)
+                self.assertIn('posts: 5 строк', output.getvalue())
+                self.assertIn('строк/с', output.getvalue())
+
+    def test_imported_posts_are_searchable_and_counted(self):
+        self.create_content()
+        transfer.export(self.directory)
+        self.clear()
+        transfer.Importer(self.directory).run()
+        self.assertEqual(len(search.search('лисицы')), 5)
+        stats = UserStats.objects.get(user__username='Tolstoy')
+        self.assertEqual((stats.post_count, stats.follower_count), (5, 1))
+        self.assertFalse(
+            User.objects.get(username='Tolstoy').has_usable_password())
+
+    def test_resume_after_failure(self):
+        self.create_content()
+        transfer.export(self.directory)
+        expected = self.snapshot()
+        self.clear()
+        original = transfer.Importer._import_comments
+        calls = []
+
+        def failing(importer, batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise RuntimeError('сбой')
+            return original(importer, batch)
+
+        with mock.patch.object(
+                transfer.Importer, '_import_comments', failing):
+            with self.assertRaises(RuntimeError):
+                transfer.Importer(self.directory, batch_size=2).run()
+        self.assertEqual(Comment.objects.count(), 2)
+        with open(os.path.join(self.directory, 'import_state.json')) as file:
+            self.assertEqual(json.load(file)['done']['comments'], 2)
+
+        transfer.Importer(self.directory, batch_size=2).run()
+        self.assertEqual(self.snapshot(), expected)
+        # Повторный запуск уже ничего не добавляет.
+        transfer.Importer(self.directory, batch_size=2).run()
+        self.assertEqual(self.snapshot(), expected)
+
+    def interrupted_import(self):
+        """Загрузка, упавшая на второй пачке постов."""
+        original = transfer.Importer._import_posts
+        calls = []
+
+        def failing(importer, batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise RuntimeError('сбой')
+            return original(importer, batch)
+
+        with mock.patch.object(transfer.Importer, '_import_posts', failing):
+            with self.assertRaises(RuntimeError):
+                transfer.Importer(self.directory, batch_size=2).run()
+
+    def test_import_ids_are_reserved(self):
+        self.create_content()
+        transfer.export(self.directory)
+        # Загрузка поверх тех же постов: её id начинаются сразу за ними.
+        self.interrupted_import()
+        author = User.objects.create_user(username='site')
+        site_post = Post.objects.create(text='пост сайта', author=author)
+        transfer.Importer(self.directory, batch_size=2).run()
+        self.assertGreater(site_post.pk, 10)
+        self.assertEqual(Post.objects.filter(author__username='Tolstoy')
+                         .values('text').distinct().count(), 5)
+        self.assertEqual(Post.objects.count(), 11)
+        self.assertEqual(Comment.objects.count(), 10)
+        self.assertFalse(site_post.comments.exists())
+
+    def test_conflicting_id_stops_import(self):
+        self.create_content()
+        transfer.export(self.directory)
+        self.clear()
+        self.interrupted_import()
+        with open(os.path.join(self.directory, 'import_state.json')) as file:
+            taken = json.load(file)['bases']['posts'] + 3
+        author = User.objects.create_user(username='site')
+        Post.objects.create(pk=taken, text='пост сайта', author=author)
+        with self.assertRaises(transfer.ImportConflict):
+            transfer.Importer(self.directory, batch_size=2).run()
+        self.assertEqual(Post.objects.get(pk=taken).text, 'пост сайта')
+        self.assertFalse(Comment.objects.filter(post_id=taken).exists())
+        # Проиндексирована только первая пачка, загруженная до сбоя.
+        self.assertEqual(len(search.search('лисицы')), 2)
+        self.assertEqual(len(search.search('сайта')), 1)
+
+    def test_images_are_taken_from_directory(self):
+        images_dir = os.path.join(self.directory, 'images')
+        os.makedirs(os.path.join(images_dir, 'old'))
+        with open(os.path.join(images_dir, 'old', 'photo.gif'), 'wb') as file:
+            file.write(make_gif('red'))
+        rows = [
+            {'id': 10, 'text': 'с картинкой', 'author': 'Tolstoy',
+             'image': 'old/photo.gif'},
+            {'id': 11, 'text': 'картинки нет', 'author': 'Tolstoy',
+             'image': 'old/missing.gif'},
+        ]
+        with open(os.path.join(self.directory, 'posts.jsonl'), 'w') as file:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+        skipped = transfer.Importer(
+            self.directory, images_dir=images_dir).run()
+        self.assertEqual(skipped['images'], 1)
+        post = Post.objects.get(text='с картинкой')
+        self.assertRegex(post.image.name, r'^posts/.+\.gif$')
+        self.assertTrue(post.thumbnail_urls)
+        self.assertFalse(Post.objects.get(text='картинки нет').image)
+
+        export_images = os.path.join(self.directory, 'export')
+        transfer.export(self.directory, images_dir=export_images)
+        self.assertTrue(
+            os.path.exists(os.path.join(export_images, post.image.name)))
@@ -1,7 +1,8 @@
 from django import forms
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Comment, Follow, Group, Post
@@ -192,3 +193,56 @@ class TestViews(TestCase):
             user=self.user,
             author=self.user1
         )
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+        cls.reader = User.objects.create_user(username='Dostoevskiy')
+        cls.group = Group.objects.create(
+            title='Red Hot Chilly Peppers',
+            slug='RHCP',
+            description='Тестовый текст для описания группы'
+        )
+        for number in range(25):
+            post = Post.objects.create(
+                text=f'тестовый текст поста {number}',
+                author=cls.author,
+                group=cls.group,
+            )
+            Comment.objects.create(
+                post=post, author=cls.reader, text='комментарий')
+        cls.post = post
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feed_pages_use_constant_number_of_queries(self):
+        pages_queries = {
+            reverse('posts:index'): 3,
+            reverse('posts:group', kwargs={'slug': self.group.slug}): 4,
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}): 5,
+            reverse('posts:follow_index'): 4,
+        }
+        for url in pages_queries:
+            self.authorized_client.get(url)
+        for per_page in (5, 10, 20):
+            for url, queries in pages_queries.items():
+                with self.subTest(url=url, per_page=per_page):
+                    with override_settings(PAGES=per_page):
+                        with self.assertNumQueries(queries):
+                            response = self.authorized_client.get(url)
+                    self.assertEqual(
+                        len(response.context['page']), per_page)
+
+    def test_feed_comment_count_annotation(self):
+        response = self.authorized_client.get(reverse('posts:index'))
+        for post in response.context['page']:
+            with self.subTest(post=post.pk):
+                self.assertEqual(post.comment_count, 1)
@@ -0,0 +1,150 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import search, workers
+from ..metrics import registry
+from ..models import Group, Post, Task
+
+User = get_user_model()
+
+calls = []
+
+
+def record(value):
+    calls.append(value)
+
+
+def fail(value):
+    raise RuntimeError(f'сбой {value}')
+
+
+def write_and_fail(slug):
+    Group.objects.create(title=slug, slug=slug)
+    raise RuntimeError('сбой после записи')
+
+
+@override_settings(TASK_BACKEND='posts.workers.DatabaseBackend')
+class DatabaseBackendTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Tolstoy')
+
+    def setUp(self):
+        cache.clear()
+        calls.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def run_workers(self):
+        while workers.Worker().run_one():
+            pass
+
+    def test_view_returns_before_side_effects(self):
+        self.client.post(reverse('posts:new_post'), {'text': 'очередь'})
+        post = Post.objects.get()
+        self.assertEqual(
+            list(Task.objects.values_list('name', 'args')),
+            [('posts.search.update_index', f'[{post.pk}]')])
+        self.assertEqual(list(search.filter_posts(Post.objects, 'очередь')),
+                         [])
+        self.run_workers()
+        self.assertEqual(list(search.filter_posts(Post.objects, 'очередь')),
+                         [post])
+        self.assertFalse(Task.objects.exists())
+
+    def test_deduplicated_tasks_are_queued_once(self):
+        workers.submit(record, 1, dedupe=True)
+        workers.submit(record, 1, dedupe=True)
+        workers.submit(record, 2, dedupe=True)
+        workers.submit(record, 3, key='record')
+        workers.submit(record, 4, key='record')
+        self.assertEqual(Task.objects.count(), 3)
+        self.run_workers()
+        self.assertEqual(sorted(calls), [1, 2, 3])
+
+    def test_other_tasks_all_run_in_order(self):
+        # Как подписка, отписка и снова подписка на того же автора.
+        workers.submit(record, 1)
+        workers.submit(record, 2)
+        workers.submit(record, 1)
+        self.run_workers()
+        self.assertEqual(calls, [1, 2, 1])
+
+    @override_settings(TASK_MAX_ATTEMPTS=2, TASK_RETRY_BACKOFF=60)
+    def test_failed_task_is_retried_with_backoff(self):
+        workers.submit(fail, 1)
+        before = timezone.now()
+        with self.assertLogs('posts.workers', 'WARNING'):
+            self.assertTrue(workers.Worker().run_one())
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.QUEUED, 1))
+        self.assertIn('RuntimeError: сбой 1', task.last_error)
+        self.assertGreaterEqual(task.run_at, before + timedelta(seconds=30))
+        # Время повтора ещё не пришло.
+        self.assertFalse(workers.Worker().run_one())
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('posts.workers', 'ERROR'):
+            self.assertTrue(workers.Worker().run_one())
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+        self.assertFalse(workers.Worker().run_one())
+
+    def test_task_of_dead_worker_is_reclaimed(self):
+        workers.submit(record, 1)
+        Task.objects.update(
+            status=Task.RUNNING,
+            locked_until=timezone.now() - timedelta(seconds=1))
+        self.run_workers()
+        self.assertEqual(calls, [1])
+
+
+@override_settings(TASK_BACKEND='posts.workers.DatabaseBackend',
+                   METRICS_ENABLED=True, TASK_MAX_ATTEMPTS=1)
+class RunWorkersCommandTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+        registry.clear()
+
+    def test_run_workers_once(self):
+        workers.submit(record, 1)
+        workers.submit(fail, 2)
+        out = StringIO()
+        with self.assertLogs('posts.workers', 'ERROR'):
+            call_command(
+                'run_workers', '--once', '--threads', '2', stdout=out)
+        self.assertEqual(calls, [1])
+        self.assertIn('Не выполнено задач: 1', out.getvalue())
+        text = registry.render()
+        self.assertIn('yatube_tasks_total{task="posts.tests.tests_workers.'
+                      'record",result="ok"} 1', text)
+        self.assertIn('yatube_tasks_total{task="posts.tests.tests_workers.'
+                      'fail",result="failed"} 1', text)
+
+
+class ThreadBackendTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_inline_without_workers(self):
+        workers.submit(record, 1)
+        self.assertEqual(calls, [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failed_inline_task_is_rolled_back_alone(self):
+        with transaction.atomic():
+            Group.objects.create(title='view', slug='view')
+            with self.assertLogs('posts.workers', 'ERROR'):
+                workers.submit(write_and_fail, 'task')
+        self.assertEqual(
+            list(Group.objects.values_list('slug', flat=True)), ['view'])
@@ -0,0 +1,137 @@
+"""Миниатюры картинок постов, подготовленные заранее.
+
+Миниатюры всех размеров из ``settings.POST_THUMBNAILS`` создаются в
+фоне сразу после загрузки картинки, а их URL сохраняются в
+``Post.thumbnails``. Шаблоны берут готовый URL и не обращаются ни к
+sorl-thumbnail, ни к Pillow. Постам, у которых URL ещё не записаны,
+``resolve`` ищет уже готовые миниатюры одним запросом к хранилищу
+метаданных sorl-thumbnail, а ``picture_sources`` собирает из
+вариантов миниатюры ``srcset`` для ``<picture>``.
+"""
+import json
+import logging
+
+from django.conf import settings
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.engines import pil_engine
+from sorl.thumbnail.images import ImageFile
+
+from . import metrics, page_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+}
+
+
+class Engine(pil_engine.Engine):
+    def _colorspace(self, image, colorspace, format):
+        image = super()._colorspace(image, colorspace, format)
+        if format == 'JPEG' and image.mode == 'RGBA':
+            # sorl оставляет RGBA у GIF и PNG с палитрой, а JPEG его не
+            # сохраняет.
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            return background
+        return image
+
+
+class Backend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, вызовы которого видны в метриках запросов."""
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        with metrics.thumbnail_call():
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def generate(post_id):
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    urls = {}
+    for name, (geometry, options) in settings.POST_THUMBNAILS.items():
+        thumbnail = get_thumbnail(post.image, geometry, **options)
+        if not thumbnail.exists():
+            logger.warning('Не удалось сделать миниатюру %s для поста %s',
+                           name, post_id)
+            return
+        urls[name] = thumbnail.url
+    # Картинку могли заменить, пока миниатюры готовились.
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails=json.dumps(urls))
+    if updated:
+        page_cache.bump_post(post)
+
+
+def thumbnail_file(source, geometry, options):
+    """``ImageFile`` миниатюры ``source`` без обращения к хранилищу.
+
+    Опции дополняются так же, как в ``ThumbnailBackend.get_thumbnail``,
+    иначе имя файла не совпадёт с тем, что создаёт sorl-thumbnail.
+    """
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def resolve(posts):
+    """Подставить постам без ``thumbnails`` уже готовые миниатюры.
+
+    Все миниатюры страницы ищутся одним ``get_many`` к хранилищу
+    метаданных; недостающие не создаются, шаблон покажет оригинал.
+    """
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'get_many'):
+        return posts
+    wanted = {}
+    for post in posts:
+        if post.image and not post.thumbnails:
+            source = ImageFile(post.image)
+            wanted[post] = {
+                name: thumbnail_file(source, geometry, options)
+                for name, (geometry, options)
+                in settings.POST_THUMBNAILS.items()}
+    if not wanted:
+        return posts
+    found = kvstore.get_many(
+        [file for files in wanted.values() for file in files.values()])
+    for post, files in wanted.items():
+        if all(found.get(file.key) for file in files.values()):
+            post.thumbnails = json.dumps(
+                {name: file.url for name, file in files.items()})
+    return posts
+
+
+def picture_sources(post, name):
+    """Варианты миниатюры ``name`` поста для тегов ``<source>``:
+    ``[{'type': MIME-тип, 'srcset': '<url> <ширина>w, ...'}]``."""
+    urls = post.thumbnail_urls
+    sources = {}
+    for alias, (geometry, options) in settings.POST_THUMBNAILS.items():
+        if alias not in urls or (
+                alias != name and not alias.startswith(f'{name}_')):
+            continue
+        width = geometry.split('x')[0]
+        candidates = sources.setdefault(options.get('format', 'JPEG'), [])
+        candidates.append(f'{urls[alias]} {width}w')
+    return [{'type': MIME_TYPES[format], 'srcset': ', '.join(candidates)}
+            for format, candidates in sources.items()]
@@ -0,0 +1,148 @@
+"""Лента подписок, заполняемая при записи (fan-out on write).
+
+Каждому подписчику при публикации поста добавляется запись в
+TimelineEntry, и лента читается одним диапазоном по индексу
+``(user, -pub_date)``. Посты авторов, у которых подписчиков не меньше
+``TIMELINE_FANOUT_LIMIT``, не раскладываются по лентам, а
+подмешиваются при чтении.
+"""
+from django.conf import settings
+from django.db.models import Count, F, Q, Sum
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+BATCH_SIZE = 1000
+
+
+def is_enabled():
+    return settings.TIMELINE_ENABLED
+
+
+def _is_big(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        follower_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def big_authors(user_id):
+    """Авторы из подписок пользователя, читаемые при чтении ленты."""
+    return list(UserStats.objects.filter(
+        user__following__user_id=user_id,
+        follower_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True))
+
+
+def trim(user_ids):
+    """Оставить в лентах не больше ``TIMELINE_MAX_LENGTH`` записей."""
+    limit = settings.TIMELINE_MAX_LENGTH
+    overflowing = TimelineEntry.objects.filter(
+        user_id__in=user_ids
+    ).values('user_id').annotate(
+        entries=Count('pk')).filter(entries__gt=limit).values_list(
+        'user_id', flat=True)
+    for user_id in overflowing:
+        stale = TimelineEntry.objects.filter(user_id=user_id).order_by(
+            '-pub_date', '-post_id').values_list('pk', flat=True)[limit:]
+        TimelineEntry.objects.filter(pk__in=list(stale)).delete()
+
+
+def fan_out(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author_id', 'pub_date').first()
+    if post is None or _is_big(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    batch = []
+    for user_id in followers.iterator():
+        batch.append(user_id)
+        if len(batch) == BATCH_SIZE:
+            _deliver(post, batch)
+            batch = []
+    if batch:
+        _deliver(post, batch)
+
+
+def _followers(author_id, user_ids):
+    return set(Follow.objects.filter(
+        author_id=author_id, user_id__in=user_ids
+    ).values_list('user_id', flat=True))
+
+
+def _deliver(post, user_ids):
+    # Порядок задач не гарантирован: пока шла рассылка, подписку могли
+    # отменить, и remove_author уже отработал. Записи кладутся только
+    # оставшимся подписчикам, а после вставки лишние удаляются.
+    user_ids = _followers(post.author_id, user_ids)
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post.pk,
+                       pub_date=post.pub_date) for user_id in user_ids],
+        ignore_conflicts=True)
+    gone = user_ids - _followers(post.author_id, user_ids)
+    if gone:
+        TimelineEntry.objects.filter(
+            user_id__in=gone, post_id=post.pk).delete()
+    trim(user_ids)
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту последние посты нового автора из подписок.
+
+    Задача сверяется с текущей подпиской, а не с порядком очереди:
+    отписка, обработанная раньше или во время вставки, её отменяет.
+    """
+    if _is_big(author_id) or not _followers(author_id, [user_id]):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list(
+        'pk', 'pub_date')[:settings.TIMELINE_MAX_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    if not _followers(author_id, [user_id]):
+        remove_author(user_id, author_id)
+        return
+    trim([user_id])
+
+
+def remove_author(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild(user_ids=None):
+    follows = Follow.objects.all()
+    if user_ids is not None:
+        follows = follows.filter(user_id__in=user_ids)
+        TimelineEntry.objects.filter(user_id__in=user_ids).delete()
+    else:
+        TimelineEntry.objects.all().delete()
+    for user_id, author_id in follows.values_list('user_id', 'author_id'):
+        backfill(user_id, author_id)
+
+
+def feed(user_id):
+    """Посты ленты подписок пользователя из его таймлайна."""
+    posts = Post.objects.for_feed()
+    authors = big_authors(user_id)
+    if not authors:
+        # Сортировка по колонкам самого таймлайна — чтение идёт прямо по
+        # индексу (user, -pub_date, -post) без сортировки.
+        return posts.filter(timeline_entries__user_id=user_id).order_by(
+            F('timeline_entries__pub_date').desc(),
+            F('timeline_entries__post_id').desc())
+    return posts.filter(
+        Q(pk__in=TimelineEntry.objects.filter(
+            user_id=user_id).values('post_id'))
+        | Q(author_id__in=authors))
+
+
+def count(user_id):
+    entries = TimelineEntry.objects.filter(user_id=user_id).count()
+    authors = big_authors(user_id)
+    if authors:
+        entries += UserStats.objects.filter(user_id__in=authors).aggregate(
+            total=Sum('post_count'))['total'] or 0
+    return entries
@@ -0,0 +1,444 @@
+"""Выгрузка и загрузка контента: группы, посты, комментарии и подписки.
+
+Каждый вид данных лежит в папке отдельным файлом ``groups``, ``posts``,
+``comments`` и ``follows`` с расширением ``.jsonl`` или ``.csv``, поля —
+в ``FIELDS``. Ссылки записываются естественными ключами: группа — slug,
+пользователь — username, пост комментария — id поста в выгрузке.
+Картинка поста — путь к файлу относительно папки с картинками.
+
+Файлы читаются потоком и пишутся в базу пачками ``bulk_create`` в
+отдельных транзакциях, так что память не растёт с размером файла,
+кроме словарей «ключ -> id» для пользователей, групп и постов.
+
+Загрузка возобновляется после сбоя. Посты и комментарии получают id
+``база + номер строки`` (база — наибольший id на момент первого
+запуска), поэтому повторная вставка пачки ничего не дублирует, а
+словарь постов восстанавливается по файлу без запросов к базе. Базы и
+число загруженных строк каждого файла хранятся в файле состояния.
+Весь диапазон id загрузки при первом запуске резервируется в счётчике
+таблицы (SQLite и PostgreSQL), так что новые посты и комментарии сайта
+получают id после него. Если под id загрузки всё же оказалась чужая
+строка, загрузка останавливается с ``ImportConflict``.
+"""
+import csv
+import json
+import os
+import shutil
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import (counters, images, page_cache, search, thumbnails, timeline,
+               workers)
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+FIELDS = {
+    'groups': ('slug', 'title', 'description'),
+    'posts': ('id', 'text', 'pub_date', 'author', 'group', 'image'),
+    'comments': ('id', 'post', 'author', 'text', 'created'),
+    'follows': ('user', 'author'),
+}
+FORMATS = ('jsonl', 'csv')
+
+
+def data_path(directory, kind, fmt):
+    return os.path.join(directory, f'{kind}.{fmt}')
+
+
+def write_rows(file, fmt, fields, rows):
+    if fmt == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+        return
+    for row in rows:
+        file.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False))
+        file.write('\n')
+
+
+def read_rows(file, fmt):
+    """Строки файла словарями; пустые значения CSV становятся None."""
+    if fmt == 'csv':
+        for row in csv.DictReader(file):
+            yield {key: value or None for key, value in row.items()}
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _export_rows(kind):
+    if kind == 'groups':
+        return Group.objects.order_by('pk').values_list(
+            'slug', 'title', 'description')
+    if kind == 'posts':
+        return (
+            (pk, text, _isoformat(pub_date), author, group, image or None)
+            for pk, text, pub_date, author, group, image
+            in Post.objects.order_by('pk').values_list(
+                'pk', 'text', 'pub_date', 'author__username', 'group__slug',
+                'image').iterator())
+    if kind == 'comments':
+        return (
+            (pk, post, author, text, _isoformat(created))
+            for pk, post, author, text, created
+            in Comment.objects.order_by('pk').values_list(
+                'pk', 'post_id', 'author__username', 'text',
+                'created').iterator())
+    return Follow.objects.order_by('pk').values_list(
+        'user__username', 'author__username')
+
+
+def export(directory, fmt='jsonl', images_dir=None, report=None):
+    """Выгрузить весь контент в ``directory``; картинки постов, если
+    задана ``images_dir``, копируются туда под своими именами."""
+    os.makedirs(directory, exist_ok=True)
+    for kind, fields in FIELDS.items():
+        started = time.monotonic()
+        counted = _Counter(_export_rows(kind))
+        path = data_path(directory, kind, fmt)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            write_rows(file, fmt, fields, counted)
+        if report:
+            report(kind, counted.count, time.monotonic() - started)
+    if images_dir:
+        _export_images(images_dir)
+
+
+def _export_images(images_dir):
+    storage = Post._meta.get_field('image').storage
+    names = (Post.objects.exclude(image='').exclude(image=None)
+             .order_by().values_list('image', flat=True).distinct())
+    for name in names.iterator():
+        target = os.path.join(images_dir, name)
+        if os.path.exists(target) or not storage.exists(name):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with storage.open(name) as source, open(target, 'wb') as file:
+            shutil.copyfileobj(source, file)
+
+
+class _Counter:
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _parse_date(value):
+    date = parse_datetime(value) if value else None
+    if date is None:
+        return timezone.now()
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class ImportConflict(Exception):
+    """Под id загрузки в базе лежит строка, созданная не загрузкой."""
+
+
+def _count_rows(path, fmt):
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8', newline='') as file:
+        return sum(1 for _ in read_rows(file, fmt))
+
+
+def _reserve_ids(model, last_id):
+    """Сдвинуть счётчик id таблицы ``model`` на ``last_id``, чтобы сайт
+    не занял id загрузки."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                'UPDATE sqlite_sequence SET seq = MAX(seq, %s) '
+                'WHERE name = %s', [last_id, table])
+            if not cursor.rowcount:
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                    [table, last_id])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)",
+                [table, last_id])
+
+
+def _check_own(model, objects):
+    """Убедиться, что под id ``objects`` лежат они сами, а не строки
+    сайта: ``bulk_create(ignore_conflicts=True)`` молча пропускает
+    занятые id."""
+    stored = {
+        pk: (author_id, text) for pk, author_id, text in
+        model.objects.filter(pk__in=[obj.pk for obj in objects])
+        .values_list('pk', 'author_id', 'text')}
+    for obj in objects:
+        if stored.get(obj.pk) != (obj.author_id, obj.text):
+            raise ImportConflict(
+                f'Id {obj.pk} в {model._meta.db_table} занят строкой, '
+                f'созданной не загрузкой; загрузка остановлена.')
+
+
+def _insert(model, objects, date_field, dates):
+    """Вставить строки загрузки и проставить им даты из файла.
+
+    ``auto_now_add`` заменяет даты при вставке текущим временем,
+    поэтому они записываются следующим запросом.
+    """
+    model.objects.bulk_create(objects, ignore_conflicts=True)
+    _check_own(model, objects)
+    for obj, date in zip(objects, dates):
+        setattr(obj, date_field, date)
+    model.objects.bulk_update(objects, [date_field])
+
+
+class Importer:
+    """Загрузка папки выгрузки с возобновлением; см. описание модуля.
+
+    ``report(kind, rows, seconds)`` вызывается после каждого файла.
+    """
+
+    def __init__(self, directory, fmt='jsonl', images_dir=None,
+                 batch_size=500, state_path=None, report=None):
+        self.directory = directory
+        self.fmt = fmt
+        self.images_dir = images_dir
+        self.batch_size = batch_size
+        self.state_path = state_path or os.path.join(
+            directory, 'import_state.json')
+        self.report = report
+        self.users = {}
+        self.groups = {}
+        self.posts = {}
+        self.skipped = {kind: 0 for kind in (*FIELDS, 'images')}
+        # Для пересчёта счётчиков, таймлайнов и кеша страниц в конце.
+        self.usernames = set()
+        self.group_slugs = set()
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as file:
+                return json.load(file)
+        bases = {}
+        with transaction.atomic():
+            for kind, model in (('posts', Post), ('comments', Comment)):
+                bases[kind] = model.objects.aggregate(pk=Max('pk'))['pk'] or 0
+                rows = _count_rows(
+                    data_path(self.directory, kind, self.fmt), self.fmt)
+                _reserve_ids(model, bases[kind] + rows)
+        return {'bases': bases, 'done': {kind: 0 for kind in FIELDS}}
+
+    def _save_state(self):
+        temporary = f'{self.state_path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(self.state, file)
+        os.replace(temporary, self.state_path)
+
+    def _user_ids(self, usernames):
+        """Дополнить словарь пользователей; недостающих создать без
+        пароля."""
+        missing = set(usernames) - set(self.users) - {None}
+        if not missing:
+            return
+        self.users.update(User.objects.filter(
+            username__in=missing).values_list('username', 'pk'))
+        new = missing - set(self.users)
+        if new:
+            password = make_password(None)
+            User.objects.bulk_create(
+                [User(username=username, password=password)
+                 for username in new], ignore_conflicts=True)
+            self.users.update(User.objects.filter(
+                username__in=new).values_list('username', 'pk'))
+
+    def run(self):
+        self.state = self._load_state()
+        self._save_state()
+        for kind in FIELDS:
+            path = data_path(self.directory, kind, self.fmt)
+            if os.path.exists(path):
+                self._import_file(kind, path)
+        self._finish()
+        return self.skipped
+
+    def _import_file(self, kind, path):
+        done = self.state['done'][kind]
+        started = time.monotonic()
+        loaded = 0
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = enumerate(read_rows(file, self.fmt))
+            for batch in _batches(rows, self.batch_size):
+                if kind == 'posts':
+                    self._map_posts(batch)
+                self._remember_keys(kind, batch)
+                batch = [(line, row) for line, row in batch if line >= done]
+                if not batch:
+                    continue
+                with transaction.atomic():
+                    created = getattr(self, f'_import_{kind}')(batch)
+                self._after_batch(kind, created)
+                loaded += len(batch)
+                self.state['done'][kind] = batch[-1][0] + 1
+                self._save_state()
+        if self.report:
+            self.report(kind, loaded, time.monotonic() - started)
+
+    def _map_posts(self, batch):
+        base = self.state['bases']['posts']
+        for line, row in batch:
+            if row.get('id') is not None:
+                self.posts[int(row['id'])] = base + line + 1
+
+    def _remember_keys(self, kind, batch):
+        for _, row in batch:
+            for field in ('author', 'user'):
+                if row.get(field):
+                    self.usernames.add(row[field])
+            if kind == 'posts' and row.get('group'):
+                self.group_slugs.add(row['group'])
+
+    def _import_groups(self, batch):
+        Group.objects.bulk_create(
+            [Group(slug=row['slug'], title=row['title'],
+                   description=row.get('description') or '')
+             for _, row in batch], ignore_conflicts=True)
+        self.groups.update(Group.objects.filter(
+            slug__in=[row['slug'] for _, row in batch]
+        ).values_list('slug', 'pk'))
+        return []
+
+    def _group_ids(self, slugs):
+        missing = set(slugs) - set(self.groups) - {None}
+        if missing:
+            self.groups.update(Group.objects.filter(
+                slug__in=missing).values_list('slug', 'pk'))
+
+    def _import_posts(self, batch):
+        base = self.state['bases']['posts']
+        self._user_ids(row['author'] for _, row in batch)
+        self._group_ids(row.get('group') for _, row in batch)
+        posts, dates = [], []
+        for line, row in batch:
+            author_id = self.users.get(row['author'])
+            if author_id is None:
+                self.skipped['posts'] += 1
+                continue
+            posts.append(Post(
+                pk=base + line + 1, text=row['text'], author_id=author_id,
+                group_id=self.groups.get(row.get('group')),
+                image=self._store_image(row.get('image')) or None))
+            dates.append(_parse_date(row.get('pub_date')))
+        _insert(Post, posts, 'pub_date', dates)
+        return posts
+
+    def _store_image(self, name):
+        """Обработать картинку из папки картинок и сохранить в хранилище
+        постов; вернуть её имя."""
+        if not name or not self.images_dir:
+            return None
+        path = os.path.join(self.images_dir, name)
+        try:
+            extension, content = images.process_file(
+                path, settings.IMAGE_MAX_SIZE, settings.IMAGE_QUALITY)
+        except (OSError, ValueError):
+            self.skipped['images'] += 1
+            return None
+        field = Post._meta.get_field('image')
+        name = os.path.splitext(os.path.basename(name))[0] + extension
+        return field.storage.save(
+            field.generate_filename(None, name), ContentFile(content))
+
+    def _import_comments(self, batch):
+        base = self.state['bases']['comments']
+        self._user_ids(row['author'] for _, row in batch)
+        comments, dates = [], []
+        for line, row in batch:
+            post_id = self.posts.get(int(row['post'] or 0))
+            author_id = self.users.get(row['author'])
+            if post_id is None or author_id is None:
+                self.skipped['comments'] += 1
+                continue
+            comments.append(Comment(
+                pk=base + line + 1, post_id=post_id, author_id=author_id,
+                text=row['text']))
+            dates.append(_parse_date(row.get('created')))
+        _insert(Comment, comments, 'created', dates)
+        return []
+
+    def _import_follows(self, batch):
+        self._user_ids(
+            username for _, row in batch
+            for username in (row['user'], row['author']))
+        follows = []
+        for _, row in batch:
+            user_id = self.users.get(row['user'])
+            author_id = self.users.get(row['author'])
+            if user_id is None or author_id is None or user_id == author_id:
+                self.skipped['follows'] += 1
+                continue
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        return []
+
+    def _after_batch(self, kind, created):
+        """То, что при обычном сохранении делают сигналы постов;
+        ``created`` — посты пачки, уже проверенные ``_check_own``."""
+        if kind != 'posts':
+            return
+        search.get_backend().index_many(
+            (post.pk, post.text) for post in created)
+        for post in created:
+            if post.image:
+                workers.submit(thumbnails.generate, post.pk, dedupe=True)
+
+    def _finish(self):
+        with connection.cursor() as cursor:
+            # Явные id не двигают последовательности PostgreSQL.
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]):
+                cursor.execute(sql)
+        user_ids = []
+        for usernames in _batches(self.usernames, self.batch_size):
+            ids = list(User.objects.filter(
+                username__in=usernames).values_list('pk', flat=True))
+            UserStats.objects.rebuild(ids)
+            user_ids += ids
+        if timeline.is_enabled():
+            followers = set()
+            for ids in _batches(user_ids, self.batch_size):
+                followers.update(Follow.objects.filter(
+                    author_id__in=ids).values_list('user_id', flat=True))
+            for ids in _batches(followers, self.batch_size):
+                timeline.rebuild(ids)
+        group_ids = Group.objects.filter(
+            slug__in=self.group_slugs).values_list('pk', flat=True)
+        counters.forget(['all'] + [f'group:{pk}' for pk in group_ids])
+        page_cache.bump(
+            'feed', *[f'group:{slug}' for slug in self.group_slugs],
+            *[f'author:{username}' for username in self.usernames])
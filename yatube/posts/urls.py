@@ -13,7 +13,10 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_post, name='group'),
     path('new/', views.new_post, name='new_post'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.post_search, name='search'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
+    path('<str:username>/<int:post_id>/comments/',
+         views.post_comments, name='comments'),
     path('<str:username>/<int:post_id>/edit/', views.post_edit, name='edit'),
     path('<str:username>/<int:post_id>/comment/',
          views.add_comment, name="add_comment"),
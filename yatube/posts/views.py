@@ -1,31 +1,41 @@
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 
-from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from . import search, thumbnails, timeline
+from .forms import CommentForm, PostForm, SearchForm
+from .models import Follow, Group, Post, User, UserStats
+from .page_cache import (cache_for_anonymous, conditional,
+                         with_card_versions)
+from .paginators import paginate, paginate_comments
+from .replicas import replica_reads
 
 
+@replica_reads
+@conditional(lambda request: ['feed', 'groups'], per_user=True)
+@cache_for_anonymous(lambda: ['feed', 'groups'])
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page = paginate(request, post_list, 'index', 'all')
     return render(request, 'index.html', {'page': page})
 
 
+@replica_reads
+@conditional(lambda request, slug: [f'group:{slug}', 'groups'],
+             per_user=True)
+@cache_for_anonymous(lambda slug: [f'group:{slug}', 'groups'])
 def group_post(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    group_paginator = Paginator(posts, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = group_paginator.get_page(page_number)
-    context = {'page': page, 'group': group, 'posts': posts}
+    posts = group.posts.for_feed()
+    page = paginate(request, posts, 'group', f'group:{group.pk}')
+    context = {'page': page, 'group': group}
     return render(request, 'group.html', context)
 
 
 @login_required
+@transaction.atomic
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
@@ -36,13 +46,17 @@ def new_post(request):
     return redirect('posts:index')
 
 
+@replica_reads
+@conditional(lambda request, username: [f'author:{username}', 'groups'],
+             per_user=True)
+@cache_for_anonymous(lambda username: [f'author:{username}', 'groups'])
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_posts = author.posts.all()
-    post_count = author.posts.all().count()
-    profile_paginator = Paginator(author_posts, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = profile_paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    stats = UserStats.objects.for_user(author)
+    author_posts = author.posts.for_feed()
+    page = paginate(request, author_posts, 'profile',
+                    f'author:{author.pk}', stats.post_count)
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=author).exists()
@@ -51,18 +65,28 @@ def profile(request, username):
     context = {'author': author,
                'author_posts': author_posts,
                'page': page,
-               'post_count': post_count,
+               'post_count': stats.post_count,
+               'stats': stats,
                'following': following}
     return render(request, 'profile.html', context)
 
 
+@replica_reads
+@conditional(
+    lambda request, username, post_id: [
+        f'post:{post_id}', f'author:{username}', 'groups'],
+    per_user=True)
+@cache_for_anonymous(
+    lambda username, post_id: [f'post:{post_id}', 'groups'])
 def post_view(request, username, post_id):
     post = get_object_or_404(
-        Post, author__username=username, id=post_id)
+        Post.objects.for_feed().select_related('author__stats'),
+        author__username=username, id=post_id)
+    thumbnails.resolve(with_card_versions([post]))
     author = post.author
-    post_count = author.posts.all().count()
+    post_count = UserStats.objects.for_user(author).post_count
     form = CommentForm()
-    comments = post.comments.filter(post=post)
+    comments = paginate_comments(request, post)
     context = {'author': author,
                'author_post': post,
                'post_count': post_count,
@@ -72,6 +96,18 @@ def post_view(request, username, post_id):
     return render(request, 'post.html', context)
 
 
+@replica_reads
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев для кнопки «Показать ещё»:
+    HTML комментариев и курсор страницы после неё."""
+    post = get_object_or_404(
+        Post.objects.only('pk'), author__username=username, id=post_id)
+    comments = paginate_comments(request, post)
+    html = render_to_string(
+        'includes/comment_list.html', {'comments': comments}, request)
+    return JsonResponse({'html': html, 'next': comments.next_cursor})
+
+
 @login_required
 def post_edit(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
@@ -86,6 +122,23 @@ def post_edit(request, username, post_id):
     return render(request, 'new_post.html', context)
 
 
+def post_search(request):
+    form = SearchForm(request.GET or None)
+    page = None
+    if form.is_valid():
+        page = search.search(
+            form.cleaned_data['q'],
+            group=form.cleaned_data['group'],
+            author=form.cleaned_data['author'],
+            after=request.GET.get('after'))
+        page.object_list = thumbnails.resolve(
+            with_card_versions(page.object_list))
+    params = request.GET.copy()
+    params.pop('after', None)
+    context = {'form': form, 'page': page, 'query': params.urlencode()}
+    return render(request, 'search.html', context)
+
+
 def page_not_found(request, exception):
     return render(
         request,
@@ -100,6 +153,7 @@ def server_error(request):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
     form = CommentForm(request.POST or None)
@@ -111,17 +165,23 @@ def add_comment(request, username, post_id):
     return redirect('posts:post', username, post_id)
 
 
+@replica_reads
 @login_required
 def follow_index(request):
     username = Follow.objects.filter(author__following__user=request.user)
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    if timeline.is_enabled():
+        post_list = timeline.feed(request.user.pk)
+        scope = f'timeline:{request.user.pk}'
+    else:
+        post_list = Post.objects.for_feed().filter(
+            author__following__user=request.user)
+        scope = f'follow:{request.user.pk}'
+    page = paginate(request, post_list, 'follow', scope)
     return render(request, 'follow.html', {'page': page, 'username': username})
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
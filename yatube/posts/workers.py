@@ -0,0 +1,189 @@
+"""Фоновые задачи после записи.
+
+``submit(func, *args)`` передаёт задачу бэкенду из ``TASK_BACKEND``:
+
+* ``ThreadBackend`` выполняет её после коммита в пуле из
+  ``BACKGROUND_WORKERS`` потоков этого процесса, а при 0 — сразу;
+* ``DatabaseBackend`` записывает её строкой ``Task`` в ту же транзакцию,
+  что и саму запись, и view отвечает сразу после коммита. Задачи
+  выполняют воркеры ``manage.py run_workers``, упавшие повторяются с
+  удваивающейся задержкой до ``TASK_MAX_ATTEMPTS`` попыток. Задачи с
+  ``dedupe=True`` (та же функция и аргументы) или с тем же ``key``
+  выполняются из очереди один раз, сколько бы их ни добавили, пока
+  первая ждала; остальные выполняются все и по порядку.
+
+Задачи — функции уровня модуля с аргументами, которые сохраняются в
+JSON. Время и исход каждой задачи попадают в метрики (``posts.metrics``).
+"""
+import hashlib
+import json
+import logging
+import random
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import (IntegrityError, close_old_connections, connection,
+                       transaction)
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import metrics
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# Сколько ближайших задач воркер пробует забрать, если первые уже
+# забрали другие.
+CLAIM_CANDIDATES = 10
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            thread_name_prefix='posts-worker')
+    return _executor
+
+
+def _call(name, func, args):
+    started = time.perf_counter()
+    result = 'ok'
+    try:
+        func(*args)
+    except Exception:
+        result = 'failed'
+        logger.exception('Фоновая задача %s упала', name)
+    metrics.record_task(name, result, time.perf_counter() - started)
+
+
+def _run(name, func, args):
+    try:
+        _call(name, func, args)
+    finally:
+        connection.close()
+
+
+def _in_savepoint(func):
+    @wraps(func)
+    def wrapper(*args):
+        with transaction.atomic():
+            func(*args)
+    return wrapper
+
+
+class ThreadBackend:
+    def submit(self, name, func, args, key):
+        if not settings.BACKGROUND_WORKERS:
+            # Задача выполняется внутри транзакции view: ошибка SQL в ней
+            # откатывает только её точку сохранения.
+            _call(name, _in_savepoint(func), args)
+            return
+        transaction.on_commit(
+            lambda: _get_executor().submit(_run, name, func, args))
+
+
+class DatabaseBackend:
+    def submit(self, name, func, args, key):
+        # Такая же задача уже ждёт в очереди — вставка пропускается.
+        Task.objects.bulk_create(
+            [Task(name=name, args=json.dumps(args), key=key)],
+            ignore_conflicts=True)
+
+
+def get_backend():
+    return import_string(settings.TASK_BACKEND)()
+
+
+def submit(func, *args, key=None, dedupe=False):
+    """Выполнить ``func(*args)`` в фоне после коммита транзакции.
+
+    ``key`` — ключ дедупликации в очереди, ``dedupe`` — ключом служат
+    функция и аргументы. Дедуплицировать можно только задачи, которым
+    неважен порядок относительно других (переиндексация, миниатюры);
+    без ключа каждая задача выполняется.
+    """
+    name = f'{func.__module__}.{func.__qualname__}'
+    if key is None:
+        key = f'{name}:{json.dumps(args)}' if dedupe else uuid.uuid4().hex
+    key = hashlib.sha1(key.encode()).hexdigest()
+    get_backend().submit(name, func, list(args), key)
+
+
+class Worker:
+    """Выполняет задачи очереди ``DatabaseBackend``."""
+
+    def claim(self):
+        now = timezone.now()
+        candidates = Task.objects.due(now).order_by(
+            'run_at', 'pk').values_list('pk', flat=True)[:CLAIM_CANDIDATES]
+        for pk in candidates:
+            # Забрать задачу может только один воркер: условное UPDATE.
+            claimed = Task.objects.due(now).filter(pk=pk).update(
+                status=Task.RUNNING, attempts=F('attempts') + 1,
+                locked_until=now + timedelta(
+                    seconds=settings.TASK_LEASE_SECONDS))
+            if claimed:
+                return Task.objects.get(pk=pk)
+        return None
+
+    def run_one(self):
+        """Выполнить одну задачу; False, если выполнять нечего."""
+        task = self.claim()
+        if task is None:
+            return False
+        started = time.perf_counter()
+        try:
+            import_string(task.name)(*json.loads(task.args))
+        except Exception:
+            self.failed(task, traceback.format_exc(),
+                        time.perf_counter() - started)
+        else:
+            Task.objects.filter(pk=task.pk).delete()
+            metrics.record_task(
+                task.name, 'ok', time.perf_counter() - started)
+        return True
+
+    def failed(self, task, error, seconds):
+        if task.attempts >= settings.TASK_MAX_ATTEMPTS:
+            Task.objects.filter(pk=task.pk).update(
+                status=Task.FAILED, last_error=error, locked_until=None)
+            logger.error('Фоновая задача %s не выполнена, попыток: %d. %s',
+                         task, task.attempts, error)
+            metrics.record_task(task.name, 'failed', seconds)
+            return
+        delay = settings.TASK_RETRY_BACKOFF * 2 ** (task.attempts - 1)
+        # Разброс, чтобы задачи, упавшие вместе, не повторялись вместе.
+        delay = random.uniform(delay / 2, delay)
+        logger.warning('Фоновая задача %s упала, повтор через %.0f с: %s',
+                       task, delay, error)
+        try:
+            with transaction.atomic():
+                Task.objects.filter(pk=task.pk).update(
+                    status=Task.QUEUED, last_error=error, locked_until=None,
+                    run_at=timezone.now() + timedelta(seconds=delay))
+        except IntegrityError:
+            # Такая же задача уже снова в очереди — её и хватит.
+            Task.objects.filter(pk=task.pk).delete()
+        metrics.record_task(task.name, 'retry', seconds)
+
+    def run(self, stop, poll, once=False):
+        """Выполнять задачи, пока не выставлен ``stop``; ``once`` —
+        остановиться, когда очередь опустеет."""
+        while not stop.is_set():
+            try:
+                busy = self.run_one()
+            finally:
+                close_old_connections()
+            if not busy:
+                if once:
+                    return
+                stop.wait(poll)
@@ -0,0 +1,17 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``. Views run in thread pools, see ``posts.asgi``::
+
+    uvicorn yatube.asgi:application
+"""
+
+import os
+
+# Как в wsgi.py: настройки задаются до импорта кода приложения.
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+from posts.asgi import get_asgi_application  # noqa: E402
+
+application = get_asgi_application()
@@ -26,6 +26,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.metrics.MetricsMiddleware',
+    'posts.replicas.PinPrimaryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -40,7 +42,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'posts.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -56,12 +58,53 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# ASGI (yatube.asgi, см. posts.asgi): потоков для views. Чтение лент и
+# страниц из ASGI_READ_VIEWS идёт в отдельный пул, чтобы долгие записи
+# не задерживали его.
+ASGI_THREADS = 8
+ASGI_READ_THREADS = 16
+ASGI_READ_VIEWS = [
+    'posts:index', 'posts:group', 'posts:profile', 'posts:post',
+    'posts:comments', 'posts:follow_index', 'about:author', 'about:tech',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+}
+# Профиль SQLite для продакшена (см. posts.backends.sqlite3): WAL,
+# прагмы, постоянное соединение и повтор записи, если база занята.
+# Включается USE_SQLITE_PRODUCTION = True.
+SQLITE_PRODUCTION = {
+    'ENGINE': 'posts.backends.sqlite3',
+    'NAME': DATABASES['default']['NAME'],
+    'CONN_MAX_AGE': 600,
+    'OPTIONS': {
+        'write_retries': 5,
+        'retry_backoff': 0.02,
+    },
 }
+USE_SQLITE_PRODUCTION = False
+if USE_SQLITE_PRODUCTION:
+    DATABASES['default'] = SQLITE_PRODUCTION
+
+DATABASE_ROUTERS = ['posts.replicas.ReplicaRouter']
+# Алиасы баз, с которых читаются ленты; [] — читать с основной базы.
+# Каждая реплика — копия основной базы в файле db.<алиас>.sqlite3,
+# обновляется командой manage.py sync_replicas.
+DATABASE_REPLICAS = []
+DATABASES.update({
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+    }
+    for alias in DATABASE_REPLICAS
+})
+# Сколько секунд после записи пользователь читает только с основной базы;
+# больше, чем отстают реплики.
+REPLICA_PIN_SECONDS = 10
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,9 +144,97 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGES = 10
+# Наибольший ?limit= в JSON API (/api/, см. posts.api).
+API_MAX_LIMIT = 1000
+# Комментариев на странице поста и в каждой догрузке «Показать ещё».
+COMMENTS_PER_PAGE = 50
+
+# Ленты с курсорной пагинацией (?after=/?before=) вместо ?page=N:
+# 'index', 'group', 'profile', 'follow'.
+CURSOR_PAGINATED_FEEDS = ()
 
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Сколько секунд хранить счётчики постов для пагинатора.
+POST_COUNT_CACHE_TIMEOUT = 60 * 10
+
+# Фоновые задачи после записи (см. posts.workers):
+# 'posts.workers.ThreadBackend' — в потоках этого процесса,
+# 'posts.workers.DatabaseBackend' — очередь в базе, её выполняет
+# manage.py run_workers.
+TASK_BACKEND = 'posts.workers.ThreadBackend'
+# Потоков ThreadBackend; 0 — выполнять задачи сразу в запросе.
+BACKGROUND_WORKERS = 0
+# Попыток задачи из очереди; задержка перед повтором — до
+# TASK_RETRY_BACKOFF секунд, удваивается с каждой попыткой.
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_BACKOFF = 10
+# Через сколько секунд задачу упавшего воркера заберёт другой.
+TASK_LEASE_SECONDS = 300
+
+# Лента подписок из заранее разложенных таймлайнов (fan-out on write).
+# После включения заполните таймлайны: manage.py rebuild_timelines.
+TIMELINE_ENABLED = False
+TIMELINE_MAX_LENGTH = 1000
+# Посты авторов с таким числом подписчиков подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 10000
+
+# Сколько секунд хранить страницы лент для анонимных посетителей;
+# 0 — не кешировать.
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Миниатюры картинок постов, которые готовятся сразу после загрузки:
+# имя -> (геометрия sorl-thumbnail, опции). Миниатюры с именами
+# '<имя>_...' — варианты <имя> других ширин и форматов для
+# <picture>/srcset, в порядке <source>; сама <имя> — запасной <img src>.
+_CARD = {'crop': 'center', 'upscale': True}
+POST_THUMBNAILS = {
+    'card_webp_480': ('480x170', {**_CARD, 'format': 'WEBP', 'quality': 80}),
+    'card_webp_720': ('720x254', {**_CARD, 'format': 'WEBP', 'quality': 80}),
+    'card_webp': ('960x339', {**_CARD, 'format': 'WEBP', 'quality': 80}),
+    'card_480': ('480x170', {**_CARD, 'format': 'JPEG'}),
+    'card_720': ('720x254', {**_CARD, 'format': 'JPEG'}),
+    'card': ('960x339', {**_CARD, 'format': 'JPEG'}),
+}
+# Движок sorl-thumbnail, который кладёт прозрачные картинки для JPEG
+# на белый фон.
+THUMBNAIL_ENGINE = 'posts.thumbnails.Engine'
+# Бэкенд sorl-thumbnail, вызовы которого учитываются в метриках запросов.
+THUMBNAIL_BACKEND = 'posts.thumbnails.Backend'
+
+# Метаданные миниатюр: cached-DB хранилище sorl-thumbnail с LRU в памяти
+# процесса. После очистки таблицы или кеша восстанавливаются командой
+# manage.py rebuild_thumbnail_store.
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_LRU_SIZE = 10000
+# Как часто вне запросов сверять поколение LRU с другими процессами.
+THUMBNAIL_LRU_CHECK_INTERVAL = 5
+
+# Загруженные картинки постов ждут обработки в IMAGE_STAGING_ROOT, затем
+# уменьшаются до IMAGE_MAX_SIZE пикселей по большей стороне и
+# перекодируются без метаданных. Процессов для обработки; 0 — обрабатывать
+# в потоке фоновой задачи (см. BACKGROUND_WORKERS).
+IMAGE_PROCESSING_WORKERS = 0
+IMAGE_STAGING_ROOT = os.path.join(BASE_DIR, 'uploads')
+IMAGE_MAX_SIZE = 2048
+IMAGE_QUALITY = 85
+
+# Полнотекстовый поиск: 'posts.search.SQLiteBackend' (FTS5) или
+# 'posts.search.PostgresBackend' (tsvector).
+SEARCH_BACKEND = 'posts.search.SQLiteBackend'
+
+# Таблицы больше этого числа строк админка без фильтров не пересчитывает
+# через COUNT(*), а показывает оценку (см. posts.paginators).
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Метрики запросов по именам URL (см. posts.metrics): гистограммы в
+# формате Prometheus на /metrics/ и журнал медленных запросов.
+METRICS_ENABLED = False
+# Запросы дольше этого числа секунд пишутся в журнал posts.metrics.
+METRICS_SLOW_REQUEST_SECONDS = 1
+# Кроме персонала, /metrics/ доступен с этих адресов.
+METRICS_ALLOWED_IPS = ['127.0.0.1']